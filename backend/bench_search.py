@@ -0,0 +1,235 @@
+"""
+Search benchmark: seeds a throwaway SQLite database with synthetic Markdown
+documents and drives /api/search through the FastAPI app in-process.
+
+    python bench_search.py --sizes 1000,5000,20000 --output bench.json
+
+Runs offline with no extra dependencies; results are printed as a table and
+optionally written as JSON for comparing runs.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+ZH_WORDS = [
+    "数据库", "索引", "查询", "优化", "缓存", "事务", "接口", "部署", "配置", "日志",
+    "权限", "用户", "文档", "搜索", "分页", "性能", "并发", "备份", "迁移", "容器",
+    "服务", "网络", "存储", "监控", "测试", "版本", "前端", "后端", "组件", "路由",
+]
+EN_WORDS = [
+    "fastapi", "sqlalchemy", "session", "engine", "router", "docker", "nginx", "redis",
+    "python", "vue", "typescript", "request", "response", "middleware", "token", "schema",
+    "migration", "sqlite", "query", "index", "cursor", "pagination", "uvicorn", "pydantic",
+]
+CODE_SNIPPETS = [
+    "from sqlalchemy import create_engine\nengine = create_engine(DATABASE_URL)",
+    "@router.get(\"/items\")\ndef read_items(db: Session = Depends(get_db)):\n    return db.query(Item).all()",
+    "docker compose up -d --build\ndocker logs -f addoc_server",
+    "const response = await request.get('/api/search', { params: { q } })",
+]
+# Mix of FTS-sized terms, short terms (LIKE fallback), multi-term and misspelled (fuzzy fallback)
+DEFAULT_QUERIES = [
+    "数据库", "索引优化", "sqlalchemy", "fastapi router", "部署 docker",
+    "库", "py", "create_engine", "sqlalchemi", "middlewere",
+]
+
+def make_paragraph(rng: random.Random) -> str:
+    parts = []
+    for _ in range(rng.randint(8, 30)):
+        if rng.random() < 0.7:
+            parts.append("".join(rng.choice(ZH_WORDS) for _ in range(rng.randint(1, 4))))
+        else:
+            parts.append(rng.choice(EN_WORDS))
+    return " ".join(parts) + "。"
+
+def make_document(rng: random.Random) -> tuple:
+    title = rng.choice(ZH_WORDS) + rng.choice(ZH_WORDS) + " " + rng.choice(EN_WORDS)
+    blocks = [f"# {title}"]
+    for _ in range(rng.randint(3, 12)):
+        roll = rng.random()
+        if roll < 0.15:
+            blocks.append(f"```python\n{rng.choice(CODE_SNIPPETS)}\n```")
+        elif roll < 0.25:
+            blocks.append(f"![{rng.choice(ZH_WORDS)}](/uploads/2024/{rng.randint(1, 12):02d}/{rng.getrandbits(64):016x}.png)")
+        elif roll < 0.35:
+            blocks.append(f"## {rng.choice(ZH_WORDS)} {rng.choice(EN_WORDS)}")
+        else:
+            blocks.append(make_paragraph(rng))
+    return title, "\n\n".join(blocks)
+
+def seed_corpus(db, models, rng: random.Random, target: int, author_id: int, batch_size: int = 1000):
+    """Grow the documents table to target rows across synthetic categories."""
+    if db.query(models.Category).count() == 0:
+        for i in range(10):
+            category = models.Category(name=f"分类{i}", sort_order=i)
+            category.sub_categories = [models.SubCategory(name=f"子分类{i}-{j}", sort_order=j) for j in range(5)]
+            db.add(category)
+        db.commit()
+    sub_ids = [sub_id for (sub_id,) in db.query(models.SubCategory.id)]
+
+    existing = db.query(models.Document).count()
+    now = datetime.now()
+    for start in range(existing, target, batch_size):
+        for i in range(start, min(start + batch_size, target)):
+            title, content = make_document(rng)
+            db.add(models.Document(
+                title=title,
+                content=content,
+                is_public=rng.random() < 0.8,
+                sub_category_id=rng.choice(sub_ids),
+                sort_order=i,
+                author_id=author_id,
+                updated_at=now - timedelta(minutes=rng.randint(0, 60 * 24 * 365)),
+            ))
+        db.commit()
+
+async def asgi_get(app, path: str, params: dict, headers: dict) -> tuple:
+    """Minimal in-process ASGI GET; returns (status, body bytes)."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": urlencode(params).encode(),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        "client": ("bench", 0),
+        "server": ("bench", 80),
+        "root_path": "",
+    }
+    status = 0
+    body = bytearray()
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            body.extend(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, bytes(body)
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+def run_case(loop, app, search_cache, params: dict, headers: dict, iterations: int, warm_cache: bool) -> dict:
+    latencies = []
+    sizes = []
+    hits = None
+    started = time.perf_counter()
+    for _ in range(iterations):
+        if not warm_cache:
+            search_cache.bump()
+        t0 = time.perf_counter()
+        status, body = loop.run_until_complete(asgi_get(app, "/api/search", params, headers))
+        latencies.append((time.perf_counter() - t0) * 1000)
+        if status != 200:
+            raise RuntimeError(f"/api/search {params} returned {status}: {body[:200]!r}")
+        sizes.append(len(body))
+        if hits is None:
+            hits = json.loads(body)["total"]
+    elapsed = time.perf_counter() - started
+    return {
+        "hits": hits,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "throughput_rps": round(iterations / elapsed, 1),
+        "response_bytes": round(statistics.fmean(sizes)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /api/search on a synthetic corpus")
+    parser.add_argument("--sizes", default="1000,5000,20000", help="comma-separated corpus sizes, grown in order")
+    parser.add_argument("--modes", default="fts,ngram,fuzzy", help="comma-separated search modes")
+    parser.add_argument("--queries", default=",".join(DEFAULT_QUERIES), help="comma-separated queries")
+    parser.add_argument("--iterations", type=int, default=50, help="requests per (size, mode, query)")
+    parser.add_argument("--limit", type=int, default=20, help="page size sent to /api/search")
+    parser.add_argument("--auth", action="store_true", help="search as a logged-in user (private docs visible)")
+    parser.add_argument("--warm-cache", action="store_true", help="let the search result cache serve repeats")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--keep-db", action="store_true", help="keep the scratch database directory")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    # The app keeps its database and uploads relative to the working directory
+    workdir = tempfile.mkdtemp(prefix="addoc_bench_")
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+
+    import main as app_main
+    import models
+    import auth_utils
+    from database import SessionLocal, engine
+    from utils.index_sync import build_indexes
+    from utils.search_cache import search_cache
+
+    app_main.on_startup()
+    db = SessionLocal()
+    admin = db.query(models.User).filter(models.User.username == "admin").first()
+    headers = {}
+    if args.auth:
+        headers["Authorization"] = "Bearer " + auth_utils.create_access_token({"sub": admin.username})
+
+    rng = random.Random(args.seed)
+    loop = asyncio.new_event_loop()
+    queries = [q for q in args.queries.split(",") if q]
+    results = []
+    try:
+        for size in (int(s) for s in args.sizes.split(",")):
+            t0 = time.perf_counter()
+            seed_corpus(db, models, rng, size, admin.id)
+            build_indexes(db)
+            print(f"\n== {size} documents (seeded + indexed in {time.perf_counter() - t0:.1f}s) ==")
+            print(f"{'mode':<7}{'query':<16}{'hits':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'rps':>9}{'bytes':>9}")
+            for mode in args.modes.split(","):
+                for q in queries:
+                    params = {"q": q, "mode": mode, "limit": args.limit}
+                    stats = run_case(loop, app_main.app, search_cache, params, headers, args.iterations, args.warm_cache)
+                    results.append({"docs": size, "mode": mode, "query": q, **stats})
+                    print(f"{mode:<7}{q:<16}{stats['hits']:>7}{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}"
+                          f"{stats['p99_ms']:>9.2f}{stats['throughput_rps']:>9.1f}{stats['response_bytes']:>9}")
+    finally:
+        loop.close()
+        db.close()
+        engine.dispose()
+        os.chdir(BACKEND_DIR)
+        if args.keep_db:
+            print(f"Scratch database left in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if output:
+        report = {
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "keep_db")},
+            "results": results,
+        }
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nResults written to {output}")
+
+if __name__ == "__main__":
+    main()
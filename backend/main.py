@@ -5,8 +5,13 @@ from fastapi.responses import FileResponse
 import os
 import uvicorn
 from database import engine, Base, SessionLocal
-from routers import auth, upload, structure, docs, search, stats, users, backup, activity
+from routers import auth, upload, structure, docs, search, stats, users, backup, activity, revisions
 from init_db import init_db
+from migrations import run_migrations
+from utils.fts import init_fts
+from utils.stats_counters import init_stats
+from utils.index_sync import build_indexes
+from utils.autosave import autosave_buffer
 import os
 
 app = FastAPI()
@@ -41,6 +46,7 @@ app.include_router(auth.router, prefix="/api")
 app.include_router(upload.router, prefix="/api")
 app.include_router(structure.router, prefix="/api")
 app.include_router(docs.router, prefix="/api")
+app.include_router(revisions.router, prefix="/api")
 app.include_router(search.router, prefix="/api")
 app.include_router(stats.router, prefix="/api")
 app.include_router(users.router, prefix="/api")
@@ -73,10 +79,18 @@ if os.path.exists(dist_path):
 @app.on_event("startup")
 def on_startup():
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    init_fts(engine)
+    init_stats(engine)
     db = SessionLocal()
     init_db(db)
+    build_indexes(db)
     db.close()
 
+@app.on_event("shutdown")
+def on_shutdown():
+    autosave_buffer.flush_all()
+
 @app.get("/api/health")
 def read_health():
     return {"status": "ok", "backend": "FastAPI running with uv"}
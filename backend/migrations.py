@@ -0,0 +1,172 @@
+from sqlalchemy import bindparam, func, inspect, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.types import LargeBinary
+
+from database import Base
+import models
+import json
+
+from utils.plaintext import markdown_to_plaintext
+from utils.render import RENDER_VERSION, render_markdown
+from utils.compression import COMPRESS_THRESHOLD
+
+def run_migrations(engine: Engine):
+    """
+    Bring an existing database up to date with models.py.
+    create_all() only creates missing tables, so columns and indexes
+    added to existing tables later are created here.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    col_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+                    print(f"Added column {table.name}.{column.name}")
+
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+    backfill_plain_text(engine)
+    backfill_rendered_html(engine)
+    backfill_versions(engine)
+    compress_bodies(engine)
+    backfill_activity_daily(engine)
+
+def backfill_plain_text(engine: Engine, batch_size: int = 500):
+    """Derive documents.plain_text for rows written before the column existed."""
+    documents = models.Document.__table__
+    filled = 0
+    with engine.begin() as conn:
+        while True:
+            rows = conn.execute(
+                documents.select().with_only_columns(documents.c.id, documents.c.content)
+                .where(documents.c.plain_text.is_(None)).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            # Keep updated_at as is: deriving a column is not an edit
+            conn.execute(
+                documents.update().where(documents.c.id == bindparam("doc_id")).values(
+                    plain_text=bindparam("text"), updated_at=documents.c.updated_at
+                ),
+                [{"doc_id": row.id, "text": markdown_to_plaintext(row.content)} for row in rows],
+            )
+            filled += len(rows)
+    if filled:
+        print(f"Backfilled plain_text for {filled} documents")
+
+def backfill_rendered_html(engine: Engine, batch_size: int = 200):
+    """
+    Render documents written before pre-rendering existed, or by an older
+    RENDER_VERSION. Each batch commits on its own so an interrupted run
+    resumes where it stopped.
+    """
+    documents = models.Document.__table__
+    stale = documents.c.render_version.is_(None) | (documents.c.render_version != RENDER_VERSION)
+    rendered = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                documents.select().with_only_columns(documents.c.id, documents.c.content)
+                .where(stale).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            params = []
+            for row in rows:
+                html, toc = render_markdown(row.content)
+                params.append({"doc_id": row.id, "html": html, "toc": json.dumps(toc, ensure_ascii=False)})
+            conn.execute(
+                documents.update().where(documents.c.id == bindparam("doc_id")).values(
+                    rendered_html=bindparam("html"), toc_json=bindparam("toc"),
+                    render_version=RENDER_VERSION, updated_at=documents.c.updated_at,
+                ),
+                params,
+            )
+        rendered += len(rows)
+    if rendered:
+        print(f"Rendered HTML for {rendered} documents")
+
+def backfill_versions(engine: Engine):
+    """documents.version for rows written before the column existed: their latest revision number."""
+    with engine.begin() as conn:
+        result = conn.execute(text(
+            "UPDATE documents SET version = COALESCE("
+            "(SELECT MAX(number) FROM document_revisions WHERE document_id = documents.id), 0) "
+            "WHERE version IS NULL"
+        ))
+    if result.rowcount:
+        print(f"Backfilled version for {result.rowcount} documents")
+
+def compress_bodies(engine: Engine, batch_size: int = 200):
+    """
+    Rewrite large content/rendered_html values stored before compression was
+    enabled; CompressedText compresses them on the way back in. Run VACUUM
+    afterwards to return the freed pages to the filesystem.
+    """
+    if COMPRESS_THRESHOLD <= 0:
+        return
+    documents = models.Document.__table__
+    marks = models.MigrationMark.__table__
+    # Rows up to the recorded id were checked at this threshold; later writes go
+    # through CompressedText, so values that didn't compress well stay TEXT for good
+    with engine.begin() as conn:
+        mark = conn.execute(select(marks.c.value).where(marks.c.name == "compress_bodies")).scalar()
+        top = conn.execute(select(func.max(documents.c.id))).scalar() or 0
+    threshold, _, checked_id = (mark or "").partition(":")
+    start = int(checked_id) if threshold == str(COMPRESS_THRESHOLD) else 0
+    if start >= top:
+        return
+
+    compressed = 0
+    for column in (documents.c.content, documents.c.rendered_html):
+        large = (func.typeof(column) == "text") & (func.length(func.cast(column, LargeBinary)) > COMPRESS_THRESHOLD)
+        last_id = start
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(
+                    documents.select().with_only_columns(documents.c.id, column)
+                    .where(large, documents.c.id > last_id, documents.c.id <= top).order_by(documents.c.id).limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                conn.execute(
+                    documents.update().where(documents.c.id == bindparam("doc_id")).values(
+                        {column.name: bindparam("value"), "updated_at": documents.c.updated_at}
+                    ),
+                    [{"doc_id": row[0], "value": row[1]} for row in rows],
+                )
+            last_id = rows[-1][0]
+            compressed += len(rows)
+
+    with engine.begin() as conn:
+        conn.execute(
+            sqlite_insert(marks).values(name="compress_bodies", value=f"{COMPRESS_THRESHOLD}:{top}")
+            .on_conflict_do_update(index_elements=[marks.c.name], set_={"value": f"{COMPRESS_THRESHOLD}:{top}"})
+        )
+    if compressed:
+        print(f"Checked {compressed} large document bodies for compression")
+
+def backfill_activity_daily(engine: Engine):
+    """Build the heatmap rollup from activity_logs the first time the table exists."""
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT 1 FROM activity_daily LIMIT 1")).first():
+            return
+        result = conn.execute(text(
+            "INSERT INTO activity_daily (user_id, day, count) "
+            "SELECT user_id, date(created_at), COUNT(*) FROM activity_logs "
+            "WHERE user_id IS NOT NULL GROUP BY user_id, date(created_at)"
+        ))
+    if result.rowcount:
+        print(f"Backfilled {result.rowcount} activity_daily rows")
+
+if __name__ == "__main__":
+    # Batch job: python migrations.py (also runs on every startup)
+    from database import engine
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
@@ -1,8 +1,12 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Text, Boolean, Index, LargeBinary, UniqueConstraint
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship, validates
 from database import Base
+import json
 from datetime import datetime
+from utils.plaintext import markdown_to_plaintext
+from utils.render import RENDER_VERSION, render_markdown
+from utils.compression import CompressedText
 
 class User(Base):
     __tablename__ = "users"
@@ -28,7 +32,7 @@ class SubCategory(Base):
     __tablename__ = "sub_categories"
 
     id = Column(Integer, primary_key=True, index=True)
-    category_id = Column(Integer, ForeignKey("categories.id"))
+    category_id = Column(Integer, ForeignKey("categories.id"), index=True)
     name = Column(String)
     sort_order = Column(Integer, default=0)
 
@@ -37,22 +41,86 @@ class SubCategory(Base):
 
 class Document(Base):
     __tablename__ = "documents"
+    __table_args__ = (
+        # Keyset paging of a subcategory's documents in sidebar order
+        Index("ix_documents_sub_category_sort", "sub_category_id", "sort_order", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    sub_category_id = Column(Integer, ForeignKey("sub_categories.id"))
+    sub_category_id = Column(Integer, ForeignKey("sub_categories.id"), index=True)
     title = Column(String)
-    content = Column(Text)
+    # Bodies over COMPRESS_THRESHOLD are stored zlib-compressed (utils/compression.py)
+    content = Column(CompressedText)
+    # Markdown-stripped copy of content for search and snippets, derived on write
+    plain_text = Column(Text)
+    # Sanitized HTML and heading TOC (JSON) rendered from content on write; only loaded for format=html
+    rendered_html = deferred(Column(CompressedText), group="rendered")
+    toc_json = deferred(Column(Text), group="rendered")
+    render_version = Column(Integer)
+    # Latest revision number; editors send it back as base_version on PATCH
+    version = Column(Integer, default=0)
     is_public = Column(Boolean, default=True)
     sort_order = Column(Integer, default=0)
-    author_id = Column(Integer, ForeignKey("users.id"))
+    author_id = Column(Integer, ForeignKey("users.id"), index=True)
     created_at = Column(DateTime, default=datetime.now)
-    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, index=True)
 
     sub_category = relationship("SubCategory", back_populates="documents")
     author = relationship("User")
+    # Never loaded on delete: callers remove revisions in bulk (utils/revisions.py::delete_revisions)
+    revisions = relationship("DocumentRevision", passive_deletes="all")
+
+    @validates("content")
+    def _derive_from_content(self, key, content):
+        self.plain_text = markdown_to_plaintext(content)
+        rendered_html, toc = render_markdown(content)
+        self.rendered_html = rendered_html
+        self.toc_json = json.dumps(toc, ensure_ascii=False)
+        self.render_version = RENDER_VERSION
+        return content
+
+class DocumentRevision(Base):
+    __tablename__ = "document_revisions"
+    __table_args__ = (
+        UniqueConstraint("document_id", "number", name="uq_document_revisions_number"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
+    number = Column(Integer, nullable=False) # 1, 2, ... per document
+    kind = Column(String, nullable=False) # snapshot, delta
+    title = Column(String)
+    author_id = Column(Integer, ForeignKey("users.id"))
+    size = Column(Integer) # length of the full content at this revision
+    data = Column(LargeBinary, nullable=False) # zlib JSON: full text or line delta (utils/revisions.py)
+    created_at = Column(DateTime, default=datetime.now)
+
+    author = relationship("User")
+
+class MigrationMark(Base):
+    # Progress of one-off data migrations (migrations.py), so finished work isn't redone at startup
+    __tablename__ = "migration_marks"
+
+    name = Column(String, primary_key=True)
+    value = Column(String, nullable=False)
+
+class StatsCounter(Base):
+    # Maintained by SQLite triggers, see utils/stats_counters.py
+    __tablename__ = "stats_counters"
+
+    scope = Column(String, primary_key=True) # site, category, author
+    scope_id = Column(Integer, primary_key=True) # 0 for site
+    docs = Column(Integer, default=0, nullable=False)
+    public_docs = Column(Integer, default=0, nullable=False)
+    users = Column(Integer, default=0, nullable=False) # site row only
 
 class ActivityLog(Base):
     __tablename__ = "activity_logs"
+    __table_args__ = (
+        # Filtered pages of the activity feed, newest first
+        Index("ix_activity_logs_action_created", "action", "created_at"),
+        Index("ix_activity_logs_target_type_created", "target_type", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), index=True)
@@ -63,3 +131,14 @@ class ActivityLog(Base):
     created_at = Column(DateTime, default=datetime.now, index=True)
 
     user = relationship("User")
+
+class ActivityDaily(Base):
+    # Per-user activity count per day, kept by utils/logger.py::log_activity for the heatmap
+    __tablename__ = "activity_daily"
+    __table_args__ = (
+        Index("ix_activity_daily_day", "day"),
+    )
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import date, datetime, timedelta
+
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Dict, Any
+from sqlalchemy import func, tuple_
+from typing import List, Dict, Any, Optional
 from database import SessionLocal
 import models
 from routers.auth import get_current_user
@@ -15,20 +17,49 @@ def get_db():
     finally:
         db.close()
 
+# Largest page of the activity feed a client may request
+MAX_PAGE_SIZE = 100
+
 @router.get("/latest")
-def get_latest_activity(limit: int = 10, db: Session = Depends(get_db)):
+def get_latest_activity(
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+    action: Optional[str] = None,
+    target_type: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
     """
     Get the latest activity logs for all users.
     Useful for a public dashboard or admin view.
+    Newest first, ordered by (time, id); pass the last row's time and id
+    as before/before_id to get the next page. Each page is one query.
     """
-    logs = db.query(models.ActivityLog).order_by(models.ActivityLog.created_at.desc()).limit(limit).all()
+    if (before is None) != (before_id is None):
+        raise HTTPException(status_code=400, detail="before and before_id must be given together")
+
+    query = db.query(
+        models.ActivityLog.id,
+        models.ActivityLog.action,
+        models.ActivityLog.target_type,
+        models.ActivityLog.target_id,
+        models.ActivityLog.details,
+        models.ActivityLog.created_at,
+        models.User.username,
+    ).outerjoin(models.User, models.User.id == models.ActivityLog.user_id)
+    if action:
+        query = query.filter(models.ActivityLog.action == action)
+    if target_type:
+        query = query.filter(models.ActivityLog.target_type == target_type)
+    if before is not None:
+        query = query.filter(tuple_(models.ActivityLog.created_at, models.ActivityLog.id) < (before, before_id))
+    logs = query.order_by(models.ActivityLog.created_at.desc(), models.ActivityLog.id.desc()).limit(limit).all()
     
     result = []
     for log in logs:
-        user_name = log.user.username if log.user else "Unknown"
         result.append({
             "id": log.id,
-            "user_name": user_name,
+            "user_name": log.username or "Unknown",
             "action": log.action,
             "target_type": log.target_type,
             "target_id": log.target_id,
@@ -37,28 +68,53 @@ def get_latest_activity(limit: int = 10, db: Session = Depends(get_db)):
         })
     return result
 
+# Heatmap default: the year shown on the dashboard calendar
+HEATMAP_DAYS = 365
+
+def heatmap_range(date_from: Optional[date], date_to: Optional[date]):
+    date_to = date_to or date.today()
+    date_from = date_from or date_to - timedelta(days=HEATMAP_DAYS)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="from must not be after to")
+    return date_from, date_to
+
 @router.get("/heatmap")
-def get_activity_heatmap(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def get_activity_heatmap(
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
     """
     Get activity heatmap data for the current logged-in user.
-    Groups activity counts by date.
+    Reads the per-day rollup, so the cost is bounded by the date range
+    (default: the last year) rather than the size of the activity log.
     """
-    # SQLite uses strftime for date formatting
-    # For PostgreSQL, use date_trunc('day', ...) or cast to date
-    # Assuming SQLite for now as per requirements
-    
-    # Query: SELECT date(created_at) as day, count(*) as count FROM activity_logs WHERE user_id = ? GROUP BY day
-    
-    # Using SQLAlchemy func.date for SQLite compatibility
-    stats = db.query(
-        func.date(models.ActivityLog.created_at).label('date'),
-        func.count(models.ActivityLog.id).label('count')
-    ).filter(
-        models.ActivityLog.user_id == current_user.id
-    ).group_by(
-        func.date(models.ActivityLog.created_at)
+    date_from, date_to = heatmap_range(date_from, date_to)
+    stats = db.query(models.ActivityDaily.day, models.ActivityDaily.count).filter(
+        models.ActivityDaily.user_id == current_user.id,
+        models.ActivityDaily.day.between(date_from, date_to),
     ).all()
     
     # Transform to dict: { "2023-01-01": 5, ... }
-    heatmap_data = {str(stat.date): stat.count for stat in stats}
+    heatmap_data = {str(stat.day): stat.count for stat in stats}
     return heatmap_data
+
+@router.get("/heatmap/site")
+def get_site_heatmap(
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Site-wide heatmap for the admin dashboard, summed over users from the same rollup."""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    date_from, date_to = heatmap_range(date_from, date_to)
+    stats = db.query(
+        models.ActivityDaily.day,
+        func.sum(models.ActivityDaily.count).label("count")
+    ).filter(
+        models.ActivityDaily.day.between(date_from, date_to)
+    ).group_by(models.ActivityDaily.day).all()
+    return {str(stat.day): stat.count for stat in stats}
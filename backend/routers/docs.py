@@ -1,6 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, defer, joinedload, undefer_group
+import json
+from datetime import datetime
+from typing import List, Literal, NamedTuple, Optional, Union
 
 from database import SessionLocal
 import models, schemas
@@ -53,57 +57,291 @@ async def get_optional_user(token: Optional[str] = Depends(oauth2_scheme_optiona
 
 
 from utils.logger import log_activity
+from utils import index_sync
+from utils.ordering import SORT_GAP, assign_order, place_between, rebalance
+from utils.conditional import etag_matches, make_etag
+from utils.render import RENDER_VERSION, render_markdown
+from utils.revisions import apply_edits, delete_revisions, record_revision
+from utils.autosave import autosave_buffer
+
+def document_query(db: Session, html: bool = False):
+    """
+    Documents with their author and breadcrumb (sub-category, category) joined in,
+    reading only the requested body: Markdown source, or pre-rendered HTML + TOC.
+    """
+    if html:
+        body_options = (defer(models.Document.content), defer(models.Document.plain_text), undefer_group("rendered"))
+    else:
+        body_options = ()
+    return db.query(models.Document).options(
+        joinedload(models.Document.sub_category).joinedload(models.SubCategory.category),
+        joinedload(models.Document.author),
+        *body_options,
+    )
+
+def with_breadcrumb(document: models.Document) -> models.Document:
+    # sub_category_name / category_name for DocumentOut
+    sub_category = document.sub_category
+    document.sub_category_name = sub_category.name if sub_category else None
+    document.category_name = sub_category.category.name if sub_category and sub_category.category else None
+    return document
+
+def load_document(db: Session, doc_id: int, html: bool = False) -> Optional[models.Document]:
+    """Load one document for DocumentOut in a single joined query."""
+    document = document_query(db, html).filter(models.Document.id == doc_id).first()
+    return with_breadcrumb(document) if document is not None else None
 
 @router.post("/docs", response_model=schemas.DocumentOut)
 def create_document(document: schemas.DocumentCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     db_document = models.Document(**document.model_dump(), author_id=current_user.id)
     db.add(db_document)
+    db.flush()
+    doc_id = db_document.id
+    record_revision(db, db_document, current_user.id)
     db.commit()
-    db.refresh(db_document)
     
     # Log activity
-    log_activity(db, current_user.id, "create", db_document.id, "doc", f"Created document: {db_document.title}")
+    log_activity(db, current_user.id, "create", doc_id, "doc", f"Created document: {document.title}")
 
-    # Enrich with category info to avoid 422 if client expects it
-    db_document.sub_category_name = None
-    db_document.category_name = None
-    
-    if db_document.sub_category:
-        db_document.sub_category_name = db_document.sub_category.name
-        if db_document.sub_category.category:
-            db_document.category_name = db_document.sub_category.category.name
-            
+    # Reload once after the log commit expired the instance; includes category info for the client
+    db_document = load_document(db, doc_id)
+    index_sync.document_saved(db_document)
     return db_document
 
-@router.get("/docs/{doc_id}", response_model=schemas.DocumentOut)
-def read_document(doc_id: int, db: Session = Depends(get_db), current_user: Optional[models.User] = Depends(get_optional_user)):
-    document = db.query(models.Document).filter(models.Document.id == doc_id).first()
-    if not document:
+# --- Bulk Operations ---
+
+MAX_BULK_SIZE = 5000
+
+def check_bulk_size(count: int):
+    if count > MAX_BULK_SIZE:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_SIZE} documents per request")
+
+def editable_ids(db: Session, ids: List[int], user: models.User) -> List[int]:
+    """All of ids, deduplicated in order, or 404/403 for the whole batch."""
+    ids = list(dict.fromkeys(ids))
+    check_bulk_size(len(ids))
+    rows = db.query(models.Document.id, models.Document.author_id).filter(models.Document.id.in_(ids)).all()
+    missing = set(ids) - {row.id for row in rows}
+    if missing:
+        raise HTTPException(status_code=404, detail={"message": "Documents not found", "ids": sorted(missing)})
+    if user.role != "admin" and any(row.author_id != user.id for row in rows):
+        raise HTTPException(status_code=403, detail="Not authorized to edit all of these documents")
+    return ids
+
+def index_rows(db: Session, ids: List[int]):
+    # Just what the in-process indexes need, without the content column
+    return db.query(
+        models.Document.id, models.Document.title, models.Document.plain_text,
+        models.Document.is_public, models.Document.sub_category_id,
+    ).filter(models.Document.id.in_(ids)).all()
+
+@router.post("/docs/bulk/fetch", response_model=List[schemas.DocumentOut])
+def fetch_documents(request: schemas.BulkIds, db: Session = Depends(get_db), current_user: Optional[models.User] = Depends(get_optional_user)):
+    """Many documents in one query, in the order asked; missing (or private, for guests) ids are skipped."""
+    check_bulk_size(len(request.ids))
+    query = document_query(db).filter(models.Document.id.in_(request.ids))
+    if current_user is None:
+        query = query.filter(models.Document.is_public == True)
+    found = {document.id: with_breadcrumb(document) for document in query}
+    return [found[doc_id] for doc_id in dict.fromkeys(request.ids) if doc_id in found]
+
+@router.post("/docs/bulk", response_model=schemas.BulkResult)
+def create_documents(request: schemas.BulkCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    check_bulk_size(len(request.documents))
+    db_documents = [models.Document(**document.model_dump(), author_id=current_user.id) for document in request.documents]
+    db.add_all(db_documents)
+    db.flush()
+    for db_document in db_documents:
+        record_revision(db, db_document, current_user.id)
+    ids = [db_document.id for db_document in db_documents]
+    log_activity(db, current_user.id, "create", None, "doc", f"Created {len(ids)} documents", commit=False)
+    db.commit()
+
+    index_sync.documents_saved(index_rows(db, ids))
+    return {"count": len(ids), "ids": ids}
+
+@router.post("/docs/bulk/update", response_model=schemas.BulkResult)
+def update_documents(request: schemas.BulkUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """Move and/or change visibility of a set of documents in one statement."""
+    ids = editable_ids(db, request.ids, current_user)
+    values = {}
+    if request.is_public is not None:
+        values[models.Document.is_public] = request.is_public
+    if request.sub_category_id is not None:
+        if not db.query(models.SubCategory.id).filter(models.SubCategory.id == request.sub_category_id).first():
+            raise HTTPException(status_code=404, detail="SubCategory not found")
+        # Append after the target's last document, keeping the order given
+        last = db.query(func.max(models.Document.sort_order)).filter(
+            models.Document.sub_category_id == request.sub_category_id,
+            models.Document.id.notin_(ids),
+        ).scalar()
+        start = (last or 0) + SORT_GAP
+        values[models.Document.sub_category_id] = request.sub_category_id
+        values[models.Document.sort_order] = case(
+            {doc_id: start + index * SORT_GAP for index, doc_id in enumerate(ids)}, value=models.Document.id
+        )
+    if not values or not ids:
+        return {"count": 0, "ids": []}
+
+    for doc_id in ids:
+        autosave_buffer.flush(doc_id)
+    db.query(models.Document).filter(models.Document.id.in_(ids)).update(values, synchronize_session=False)
+    changes = []
+    if request.sub_category_id is not None:
+        changes.append(f"moved to sub-category {request.sub_category_id}")
+    if request.is_public is not None:
+        changes.append("made public" if request.is_public else "made private")
+    log_activity(db, current_user.id, "update", None, "doc", f"Updated {len(ids)} documents: {', '.join(changes)}", commit=False)
+    db.commit()
+
+    index_sync.documents_saved(index_rows(db, ids))
+    return {"count": len(ids), "ids": ids}
+
+@router.post("/docs/bulk/delete", response_model=schemas.BulkResult)
+def delete_documents(request: schemas.BulkIds, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    ids = editable_ids(db, request.ids, current_user)
+    if not ids:
+        return {"count": 0, "ids": []}
+
+    for doc_id in ids:
+        autosave_buffer.discard(doc_id)
+    delete_revisions(db, ids)
+    db.query(models.Document).filter(models.Document.id.in_(ids)).delete(synchronize_session=False)
+    log_activity(db, current_user.id, "delete", None, "doc", f"Deleted {len(ids)} documents", commit=False)
+    db.commit()
+
+    index_sync.documents_deleted(ids)
+    return {"count": len(ids), "ids": ids}
+
+class Validators(NamedTuple):
+    """Everything DocumentOut depends on except the body (content changes bump updated_at)."""
+    id: int
+    is_public: bool
+    updated_at: datetime
+    render_version: Optional[int]
+    sub_category_name: Optional[str]
+    category_name: Optional[str]
+    username: Optional[str]
+    avatar: Optional[str]
+    role: Optional[str]
+
+def document_validators(db: Session, doc_id: int) -> Optional[Validators]:
+    """Validators alone, so revalidation never reads the content column."""
+    row = (
+        db.query(
+            models.Document.id,
+            models.Document.is_public,
+            models.Document.updated_at,
+            models.Document.render_version,
+            models.SubCategory.name.label("sub_category_name"),
+            models.Category.name.label("category_name"),
+            models.User.username,
+            models.User.avatar,
+            models.User.role,
+        )
+        .outerjoin(models.SubCategory, models.Document.sub_category_id == models.SubCategory.id)
+        .outerjoin(models.Category, models.SubCategory.category_id == models.Category.id)
+        .outerjoin(models.User, models.Document.author_id == models.User.id)
+        .filter(models.Document.id == doc_id)
+        .first()
+    )
+    return Validators(*row) if row is not None else None
+
+def validators_of(document: models.Document) -> Validators:
+    """The same validators, taken from a document loaded by load_document."""
+    author = document.author
+    return Validators(
+        document.id, document.is_public, document.updated_at, document.render_version,
+        document.sub_category_name, document.category_name,
+        author.username if author else None,
+        author.avatar if author else None,
+        author.role if author else None,
+    )
+
+def html_view(document: models.Document) -> schemas.DocumentHtmlOut:
+    if document.rendered_html is None or document.render_version != RENDER_VERSION:
+        # Not backfilled yet: render on the fly without storing
+        document.html, document.toc = render_markdown(document.content)
+    else:
+        document.html = document.rendered_html
+        document.toc = json.loads(document.toc_json or "[]")
+    return schemas.DocumentHtmlOut.model_validate(document)
+
+@router.get("/docs/{doc_id}", response_model=Union[schemas.DocumentOut, schemas.DocumentHtmlOut])
+def read_document(doc_id: int, request: Request, response: Response, format: Literal["markdown", "html"] = "markdown", db: Session = Depends(get_db), current_user: Optional[models.User] = Depends(get_optional_user)):
+    # Revalidation reads the validators alone, so a 304 never loads the body;
+    # otherwise the document is loaded once and the validators come from it.
+    # No Last-Modified: renames of the breadcrumb have no timestamp, only the ETag sees them
+    conditional = "if-none-match" in request.headers
+    document = None
+    if conditional:
+        validators = document_validators(db, doc_id)
+    else:
+        document = load_document(db, doc_id, html=format == "html")
+        validators = validators_of(document) if document else None
+    if not validators:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    if not document.is_public and not current_user:
+    if not validators.is_public and not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated to view this document")
-    
-    # Enrich with category info
-    document.sub_category_name = None
-    document.category_name = None
-    
-    if document.sub_category:
-        document.sub_category_name = document.sub_category.name
-        if document.sub_category.category:
-            document.category_name = document.sub_category.category.name
-    
-    return document
+
+    headers = {
+        "ETag": make_etag(format, *validators),
+        "Cache-Control": "no-cache" if validators.is_public else "private, no-cache",
+        "Vary": "Authorization",
+    }
+    if conditional and etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    if document is None:
+        document = load_document(db, doc_id, html=format == "html")
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+    response.headers.update(headers)
+    return html_view(document) if format == "html" else document
 
 @router.put("/docs/reorder")
 def reorder_documents(request: schemas.ReorderRequest, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    for index, doc_id in enumerate(request.ids):
-        db.query(models.Document).filter(models.Document.id == doc_id).update({"sort_order": index})
+    assign_order(db, models.Document, request.ids)
+    db.commit()
+    index_sync.order_changed()
+    return {"status": "success"}
+
+@router.put("/docs/{doc_id}/move")
+def move_document(doc_id: int, request: schemas.MoveRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    db_document = db.query(models.Document).filter(models.Document.id == doc_id).first()
+    if not db_document:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    siblings = models.Document.sub_category_id == db_document.sub_category_id
+    if place_between(db, models.Document, db_document, siblings, request.after_id, request.before_id):
+        background_tasks.add_task(rebalance, models.Document, siblings)
     db.commit()
+    index_sync.order_changed()
     return {"status": "success"}
 
+def version_conflict(current: int) -> HTTPException:
+    return HTTPException(status_code=409, detail={"message": "Document was changed since base_version", "version": current})
+
+def commit_update(db: Session, doc_id: int, user: models.User, title: str) -> models.Document:
+    """Commit a PUT/PATCH, log it and reindex; returns the reloaded document."""
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent save took the same revision number
+        db.rollback()
+        raise version_conflict(db.query(models.Document.version).filter(models.Document.id == doc_id).scalar() or 0)
+
+    # Log activity
+    log_activity(db, user.id, "update", doc_id, "doc", f"Updated document: {title}")
+
+    db_document = load_document(db, doc_id)
+    index_sync.document_saved(db_document)
+    return db_document
+
 @router.put("/docs/{doc_id}", response_model=schemas.DocumentOut)
 def update_document(doc_id: int, document: schemas.DocumentUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    autosave_buffer.flush(doc_id)
     db_document = db.query(models.Document).filter(models.Document.id == doc_id).first()
     if not db_document:
         raise HTTPException(status_code=404, detail="Document not found")
@@ -112,17 +350,66 @@ def update_document(doc_id: int, document: schemas.DocumentUpdate, db: Session =
     if db_document.author_id != current_user.id and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to edit this document")
 
+    previous, previous_title = db_document.content, db_document.title
     for key, value in document.model_dump().items():
         setattr(db_document, key, value)
+    if db_document.content != previous or db_document.title != previous_title:
+        record_revision(db, db_document, current_user.id, previous, previous_title)
     
-    db.commit()
-    db.refresh(db_document)
+    return commit_update(db, doc_id, current_user, document.title)
 
-    # Log activity
-    log_activity(db, current_user.id, "update", db_document.id, "doc", f"Updated document: {db_document.title}")
+@router.patch("/docs/{doc_id}", response_model=schemas.DocumentOut)
+def patch_document(doc_id: int, patch: schemas.DocumentPatch, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    autosave_buffer.flush(doc_id)
+    db_document = db.query(models.Document).filter(models.Document.id == doc_id).first()
+    if not db_document:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    if db_document.author_id != current_user.id and current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to edit this document")
+
+    changes = patch.model_dump(exclude_unset=True, exclude={"edits", "base_version"})
+    if patch.edits is not None and "content" in changes:
+        raise HTTPException(status_code=400, detail="Send either content or edits, not both")
+    if patch.edits is not None and patch.base_version is None:
+        raise HTTPException(status_code=400, detail="edits require base_version")
+    current_version = db_document.version or 0
+    if patch.base_version is not None and patch.base_version != current_version:
+        raise version_conflict(current_version)
 
+    previous, previous_title = db_document.content, db_document.title
+    if patch.edits is not None:
+        changes["content"] = apply_edits(previous or "", patch.edits)
+    # Only touch what changed, so a title-only patch doesn't re-derive the content columns
+    for key, value in changes.items():
+        if value is not None and getattr(db_document, key) != value:
+            setattr(db_document, key, value)
+    if db_document.content != previous or db_document.title != previous_title:
+        record_revision(db, db_document, current_user.id, previous, previous_title)
+    return commit_update(db, doc_id, current_user, db_document.title)
+
+def editable_document(db: Session, doc_id: int, user: models.User) -> models.Document:
+    db_document = db.query(models.Document).filter(models.Document.id == doc_id).first()
+    if not db_document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if db_document.author_id != user.id and user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to edit this document")
     return db_document
 
+@router.post("/docs/{doc_id}/autosave", status_code=status.HTTP_202_ACCEPTED)
+def autosave_document(doc_id: int, patch: schemas.DocumentPatch, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """Buffer an editor autosave; it is written with the others within the autosave window."""
+    db_document = editable_document(db, doc_id, current_user)
+    return autosave_buffer.stage(db, db_document, current_user.id, patch)
+
+@router.post("/docs/{doc_id}/flush", response_model=schemas.DocumentOut)
+def flush_document(doc_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """Save and close: write buffered autosaves now and return the stored document."""
+    editable_document(db, doc_id, current_user)
+    autosave_buffer.close(doc_id)
+    db.expire_all()
+    return load_document(db, doc_id)
+
 @router.delete("/docs/{doc_id}")
 def delete_document(doc_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     db_document = db.query(models.Document).filter(models.Document.id == doc_id).first()
@@ -133,8 +420,11 @@ def delete_document(doc_id: int, db: Session = Depends(get_db), current_user: mo
         raise HTTPException(status_code=403, detail="Not authorized to delete this document")
 
     doc_title = db_document.title # Save for log
+    autosave_buffer.discard(doc_id)
+    delete_revisions(db, [doc_id])
     db.delete(db_document)
     db.commit()
+    index_sync.documents_deleted([doc_id])
 
     # Log activity
     log_activity(db, current_user.id, "delete", doc_id, "doc", f"Deleted document: {doc_title}")
@@ -0,0 +1,71 @@
+import difflib
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+import models, schemas
+from routers.auth import get_current_user
+from utils.revisions import reconstruct
+
+router = APIRouter()
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_revision(db: Session, doc_id: int, number: int):
+    found = reconstruct(db, doc_id, number)
+    if found is None:
+        raise HTTPException(status_code=404, detail=f"Revision {number} not found")
+    return found
+
+@router.get("/docs/{doc_id}/revisions", response_model=List[schemas.RevisionOut])
+def list_revisions(doc_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    if not db.query(models.Document.id).filter(models.Document.id == doc_id).first():
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    # Metadata only: the compressed payload is measured, not loaded
+    rows = (
+        db.query(
+            models.DocumentRevision.number,
+            models.DocumentRevision.kind,
+            models.DocumentRevision.title,
+            models.DocumentRevision.author_id,
+            models.User.username.label("author_name"),
+            models.DocumentRevision.size,
+            func.length(models.DocumentRevision.data).label("stored_size"),
+            models.DocumentRevision.created_at,
+        )
+        .outerjoin(models.User, models.DocumentRevision.author_id == models.User.id)
+        .filter(models.DocumentRevision.document_id == doc_id)
+        .order_by(models.DocumentRevision.number.desc())
+        .all()
+    )
+    return [schemas.RevisionOut(**row._mapping) for row in rows]
+
+@router.get("/docs/{doc_id}/revisions/diff", response_model=schemas.RevisionDiff)
+def diff_revisions(doc_id: int, from_number: int = Query(..., alias="from"), to_number: int = Query(..., alias="to"), db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    _, old = get_revision(db, doc_id, from_number)
+    _, new = get_revision(db, doc_id, to_number)
+    diff = difflib.unified_diff(
+        old.splitlines(keepends=True), new.splitlines(keepends=True),
+        fromfile=f"r{from_number}", tofile=f"r{to_number}",
+    )
+    return {"from_number": from_number, "to_number": to_number, "diff": "".join(diff)}
+
+@router.get("/docs/{doc_id}/revisions/{number}", response_model=schemas.RevisionDetail)
+def read_revision(doc_id: int, number: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    revision, content = get_revision(db, doc_id, number)
+    return {
+        "number": revision.number,
+        "title": revision.title,
+        "content": content,
+        "author_id": revision.author_id,
+        "created_at": revision.created_at,
+    }
@@ -1,13 +1,32 @@
-from fastapi import APIRouter, Depends, Query
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
+from sqlalchemy import text, select, literal, column, and_, or_, case, func, Integer, Float
 from typing import List, Optional
+from datetime import datetime
+from bisect import bisect_right
 
 from database import SessionLocal
 import models, schemas
+from routers.auth import get_current_user
 from routers.docs import get_optional_user
+from utils import fts
+from utils.cursor import encode_cursor, decode_cursor
+from utils.snippet import build_snippets, find_hits
+from utils.ngram_index import ngram_index, cjk_runs, is_cjk
+from utils.search_cache import search_cache
+from utils.suggest_index import suggest_index
+from utils.trigram_index import trigram_index, words, DEFAULT_THRESHOLD
 
 router = APIRouter()
 
+# Largest page a client may request
+MAX_PAGE_SIZE = 100
+# Hard cap on how deep a result list can be paged
+MAX_SEARCH_RESULTS = 1000
+MAX_SUGGESTIONS = 20
+
 def get_db():
     db = SessionLocal()
     try:
@@ -15,43 +34,237 @@ def get_db():
     finally:
         db.close()
 
-@router.get("/search", response_model=List[schemas.SearchResult])
+def project_rows(query, include_content: bool = False):
+    """Columns a search hit needs, with breadcrumb names joined in instead of lazy-loaded."""
+    return query.with_entities(
+        models.Document.id,
+        models.Document.title,
+        models.Document.plain_text,
+        models.Document.content if include_content else literal(None).label("content"),
+        models.Document.is_public,
+        models.Document.updated_at,
+        models.SubCategory.name.label("sub_category_name"),
+        models.Category.name.label("category_name"),
+    ).outerjoin(
+        models.SubCategory, models.SubCategory.id == models.Document.sub_category_id
+    ).outerjoin(
+        models.Category, models.Category.id == models.SubCategory.category_id
+    )
+
+def scope_filters(category_id, sub_category_id, author_id, updated_from, updated_to) -> list:
+    """WHERE clauses for the optional search scope; each is served by an index on documents."""
+    clauses = []
+    if category_id is not None:
+        clauses.append(models.Document.sub_category_id.in_(
+            select(models.SubCategory.id).where(models.SubCategory.category_id == category_id)
+        ))
+    if sub_category_id is not None:
+        clauses.append(models.Document.sub_category_id == sub_category_id)
+    if author_id is not None:
+        clauses.append(models.Document.author_id == author_id)
+    if updated_from is not None:
+        clauses.append(models.Document.updated_at >= updated_from)
+    if updated_to is not None:
+        clauses.append(models.Document.updated_at <= updated_to)
+    return clauses
+
+def scope_ids(db: Session, scope: list) -> set:
+    """Resolve the scope to doc ids for the in-memory indexes, via the documents indexes."""
+    return {doc_id for (doc_id,) in db.query(models.Document.id).filter(*scope)}
+
+def sql_page(db: Session, terms: list, public_only: bool, scope: list, after, page_size: int, include_content: bool = False):
+    """(total, [(score, row), ...]) from the FTS5 index, or a LIKE scan for short terms."""
+    query = db.query(models.Document).filter(*scope)
+    if fts.can_use_fts(terms):
+        # Ranked full-text lookup; bm25() is lower-is-better
+        weights = ", ".join(str(w) for w in fts.BM25_WEIGHTS)
+        hits = text(
+            f"SELECT rowid AS doc_id, bm25({fts.FTS_TABLE}, {weights}) AS rank "
+            f"FROM {fts.FTS_TABLE} WHERE {fts.FTS_TABLE} MATCH :match"
+        ).bindparams(match=fts.build_match_query(terms)).columns(doc_id=Integer, rank=Float).subquery()
+        query = query.join(hits, hits.c.doc_id == models.Document.id)
+        score = hits.c.rank
+    else:
+        # Terms too short for the trigram index: scan, but still rank title hits first
+        query = query.filter(and_(*[
+            (models.Document.title.ilike(f"%{term}%")) | 
+            (models.Document.plain_text.ilike(f"%{term}%"))
+            for term in terms
+        ]))
+        title_hit = and_(*[models.Document.title.ilike(f"%{term}%") for term in terms])
+        score = case((title_hit, 0.0), else_=1.0)
+    
+    if public_only:
+        query = query.filter(models.Document.is_public == True)
+
+    # Count without materializing any rows
+    total = query.with_entities(func.count(models.Document.id)).scalar()
+
+    if after:
+        last_score, last_id = after
+        query = query.filter(or_(score > last_score, and_(score == last_score, models.Document.id > last_id)))
+
+    rows = []
+    if page_size:
+        rows = project_rows(query, include_content).add_columns(score.label("score")).order_by(score, models.Document.id).limit(page_size + 1).all()
+    return total, [(row.score, row) for row in rows]
+
+def id_filter(doc_ids) -> list:
+    """WHERE clause restricting to doc_ids, bound as one JSON parameter however many there are."""
+    ids = select(column("value")).select_from(func.json_each(json.dumps(sorted(doc_ids))))
+    return [models.Document.id.in_(ids)]
+
+def index_page(db: Session, hits: list, after, page_size: int, include_content: bool = False):
+    """(total, [(score, row), ...]) for the sorted (score, id) hits of an in-memory index."""
+    start = bisect_right(hits, after) if after else 0
+    page = hits[start:start + page_size + 1] if page_size else []
+    rows = {}
+    if page:
+        query = db.query(models.Document).filter(models.Document.id.in_([doc_id for _, doc_id in page]))
+        rows = {row.id: row for row in project_rows(query, include_content)}
+    return len(hits), [(score, rows[doc_id]) for score, doc_id in page if doc_id in rows]
+
+@router.get("/search", response_model=schemas.SearchPage)
 def search_documents(
     q: str = Query(..., min_length=1), 
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    mode: str = Query("fts", pattern="^(fts|ngram|fuzzy)$"),
+    threshold: float = Query(DEFAULT_THRESHOLD, ge=0.05, le=1.0),
+    category_id: Optional[int] = None,
+    sub_category_id: Optional[int] = None,
+    author_id: Optional[int] = None,
+    updated_from: Optional[datetime] = None,
+    updated_to: Optional[datetime] = None,
+    include_content: bool = False,
     db: Session = Depends(get_db), 
     current_user: Optional[models.User] = Depends(get_optional_user)
 ):
-    query = db.query(models.Document).filter(
-        (models.Document.title.ilike(f"%{q}%")) | 
-        (models.Document.content.ilike(f"%{q}%"))
+    terms = fts.split_terms(q) or [q]
+
+    # All search modes match case-insensitively, so case and spacing don't split the cache
+    cache_key = (
+        " ".join(terms).lower(), current_user is not None, mode, threshold, limit, cursor, include_content,
+        category_id, sub_category_id, author_id, updated_from, updated_to,
     )
-    
-    if not current_user:
-        query = query.filter(models.Document.is_public == True)
-        
-    documents = query.all()
+    generation = search_cache.generation
+    # Pages carrying full document bodies aren't cached: the LRU is bounded by entries, not bytes
+    cacheable = not include_content
+    cached = search_cache.get(cache_key) if cacheable else None
+    if cached is not None:
+        return cached
+
+    # Every mode orders by (score, id) ascending, so (score, id) is a stable keyset cursor
+    after = None
+    served = 0
+    if cursor:
+        last_score, last_id, served = decode_cursor(cursor, 3)
+        try:
+            after, served = (float(last_score), int(last_id)), int(served)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    page_size = max(0, min(limit, MAX_SEARCH_RESULTS - served))
+
+    public_only = not current_user
+    scope = scope_filters(category_id, sub_category_id, author_id, updated_from, updated_to)
+    allowed = None
+    if scope and mode != "fts":
+        allowed = scope_ids(db, scope)
+
+    total, page = 0, []
+    highlight_words = {}
+    answered_by = mode
+    if mode != "fuzzy":
+        hits = None
+        sql_terms, sql_scope = terms, scope
+        if mode == "ngram" and ngram_index.ready:
+            # CJK bigram postings; None means the query has nothing indexable
+            hits = ngram_index.search(q, public_only=public_only, allowed=allowed)
+        elif mode == "fts" and ngram_index.ready and not fts.can_use_fts(terms):
+            # CJK words are mostly shorter than the FTS trigram: the n-gram index
+            # serves them, and only what is left over (if any) goes to SQL
+            short_cjk = [term for term in terms if len(term) < fts.MIN_TERM_LENGTH and is_cjk(term)]
+            if short_cjk:
+                if scope and allowed is None:
+                    allowed = scope_ids(db, scope)
+                hits = ngram_index.search(" ".join(short_cjk), public_only=public_only, allowed=allowed)
+                answered_by = "ngram"
+                sql_terms = [term for term in terms if term not in short_cjk]
+                if sql_terms:
+                    sql_scope = scope + id_filter(doc_id for _, doc_id in hits)
+                    hits = None
+        if hits is not None:
+            total, page = index_page(db, hits, after, page_size, include_content)
+        else:
+            total, page = sql_page(db, sql_terms, public_only, sql_scope, after, page_size, include_content)
+
+    # Fuzzy mode, also used whenever the exact search finds nothing.
+    # The exact total stays 0 on later pages, so cursors keep landing here.
+    # Only Latin words can be fuzzed: CJK parts stay exact filters (via the n-gram
+    # index), and a term that is neither rules the fallback out.
+    cjk_parts = [run for term in terms for run in cjk_runs(term)]
+    fuzzable = all(cjk_runs(term) or words(term) for term in terms) and (not cjk_parts or ngram_index.ready)
+    if total == 0 and trigram_index.ready and fuzzable:
+        if scope and allowed is None:
+            allowed = scope_ids(db, scope)
+        if cjk_parts:
+            exact = ngram_index.search(" ".join(cjk_parts), public_only=public_only, allowed=allowed)
+            allowed = {doc_id for _, doc_id in exact}
+        fuzzy = trigram_index.search(q, threshold=threshold, public_only=public_only, allowed=allowed)
+        if fuzzy is not None:
+            hits, highlight_words = fuzzy
+            if cjk_parts:
+                highlight_words = {doc_id: matched + cjk_parts for doc_id, matched in highlight_words.items()}
+            total, page = index_page(db, hits, after, page_size, include_content)
+            answered_by = "fuzzy"
+        elif cjk_parts:
+            # Nothing to fuzz (CJK only): the exact n-gram matches are the answer
+            total, page = index_page(db, exact, after, page_size, include_content)
+            answered_by = "ngram"
+
+    has_more = len(page) > page_size
+    page = page[:page_size]
     
     results = []
-    for doc in documents:
-        # Simple snippet generation
-        snippet = doc.content[:200] + "..." if len(doc.content) > 200 else doc.content
-        
-        cat_name = None
-        sub_name = None
-        if doc.sub_category:
-            sub_name = doc.sub_category.name
-            if doc.sub_category.category:
-                cat_name = doc.sub_category.category.name
+    for score, row in page:
+        # Fuzzy hits highlight the indexed words that matched, not the misspelled query
+        hit_terms = highlight_words.get(row.id, terms)
+        snippets = build_snippets(row.plain_text or "", hit_terms)
 
         results.append(schemas.SearchResult(
-            id=doc.id,
-            title=doc.title,
-            content=doc.content,
-            snippet=snippet,
-            category_name=cat_name,
-            sub_category_name=sub_name,
-            is_public=doc.is_public,
-            updated_at=doc.updated_at
+            id=row.id,
+            title=row.title,
+            content=row.content,
+            snippet=snippets[0]["text"] if snippets else None,
+            snippets=snippets,
+            title_highlights=[list(span) for span in find_hits(row.title, hit_terms)],
+            category_name=row.category_name,
+            sub_category_name=row.sub_category_name,
+            is_public=row.is_public,
+            updated_at=row.updated_at
         ))
+
+    next_cursor = None
+    if has_more:
+        last_score, last_row = page[-1]
+        next_cursor = encode_cursor(last_score, last_row.id, served + len(page))
         
-    return results
+    result_page = schemas.SearchPage(total=total, next_cursor=next_cursor, mode=answered_by, items=results)
+    if cacheable:
+        search_cache.put(cache_key, result_page, generation)
+    return result_page
+
+@router.get("/search/cache-stats")
+def read_search_cache_stats(current_user: models.User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return search_cache.stats()
+
+@router.get("/search/suggest", response_model=List[schemas.Suggestion])
+def suggest(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=MAX_SUGGESTIONS),
+    current_user: Optional[models.User] = Depends(get_optional_user)
+):
+    """Typeahead over document titles and category/subcategory names, served from memory."""
+    return suggest_index.suggest(q, limit=limit, public_only=not current_user)
@@ -12,16 +12,52 @@ def get_db():
     finally:
         db.close()
 
+# Counters are kept by triggers (utils/stats_counters.py), so these are plain reads
+
 @router.get("/stats")
 def get_stats(db: Session = Depends(get_db)):
-    total_docs = db.query(models.Document).count()
-    public_docs = db.query(models.Document).filter(models.Document.is_public == True).count()
-    private_docs = db.query(models.Document).filter(models.Document.is_public == False).count()
-    total_users = db.query(models.User).count()
+    site = db.query(models.StatsCounter).filter(
+        models.StatsCounter.scope == "site", models.StatsCounter.scope_id == 0
+    ).first()
+    total_docs = site.docs if site else 0
+    public_docs = site.public_docs if site else 0
     
     return {
         "total_docs": total_docs,
         "public_docs": public_docs,
-        "private_docs": private_docs,
-        "total_users": total_users
+        "private_docs": total_docs - public_docs,
+        "total_users": site.users if site else 0
     }
+
+@router.get("/stats/categories")
+def get_category_stats(db: Session = Depends(get_db)):
+    rows = db.query(
+        models.Category.id,
+        models.Category.name,
+        models.StatsCounter.docs,
+        models.StatsCounter.public_docs,
+    ).outerjoin(
+        models.StatsCounter,
+        (models.StatsCounter.scope == "category") & (models.StatsCounter.scope_id == models.Category.id),
+    ).order_by(models.Category.sort_order, models.Category.id).all()
+    return [
+        {"category_id": row.id, "name": row.name, "total_docs": row.docs or 0, "public_docs": row.public_docs or 0}
+        for row in rows
+    ]
+
+@router.get("/stats/authors")
+def get_author_stats(db: Session = Depends(get_db)):
+    rows = db.query(
+        models.StatsCounter.scope_id,
+        models.User.username,
+        models.StatsCounter.docs,
+        models.StatsCounter.public_docs,
+    ).outerjoin(
+        models.User, models.User.id == models.StatsCounter.scope_id
+    ).filter(
+        models.StatsCounter.scope == "author", models.StatsCounter.docs > 0
+    ).order_by(models.StatsCounter.docs.desc()).all()
+    return [
+        {"author_id": row.scope_id, "username": row.username, "total_docs": row.docs, "public_docs": row.public_docs}
+        for row in rows
+    ]
@@ -1,13 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, status
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import func, and_, or_, true
+from typing import List, Optional
 
 from database import SessionLocal
 import models, schemas
 from routers.auth import get_current_user
+from routers.docs import get_optional_user
+from utils import index_sync
+from utils.tree_cache import tree_cache
+from utils.cursor import encode_cursor, decode_cursor
+from utils.conditional import etag_matches
+from utils.ordering import assign_order, place_between, rebalance
+from utils.revisions import delete_revisions
 
 router = APIRouter()
 
+MAX_BRANCH_PAGE_SIZE = 200
+
 def get_db():
     db = SessionLocal()
     try:
@@ -23,6 +34,7 @@ def create_category(category: schemas.CategoryCreate, db: Session = Depends(get_
     db.add(db_category)
     db.commit()
     db.refresh(db_category)
+    index_sync.category_saved(db_category)
     return db_category
 
 @router.get("/categories", response_model=List[schemas.CategoryOut])
@@ -32,9 +44,21 @@ def read_categories(skip: int = 0, limit: int = 100, db: Session = Depends(get_d
 
 @router.put("/categories/reorder")
 def reorder_categories(request: schemas.ReorderRequest, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    for index, cat_id in enumerate(request.ids):
-        db.query(models.Category).filter(models.Category.id == cat_id).update({"sort_order": index})
+    assign_order(db, models.Category, request.ids)
+    db.commit()
+    index_sync.order_changed()
+    return {"status": "success"}
+
+@router.put("/categories/{category_id}/move")
+def move_category(category_id: int, request: schemas.MoveRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    db_category = db.query(models.Category).filter(models.Category.id == category_id).first()
+    if not db_category:
+        raise HTTPException(status_code=404, detail="Category not found")
+
+    if place_between(db, models.Category, db_category, true(), request.after_id, request.before_id):
+        background_tasks.add_task(rebalance, models.Category, true())
     db.commit()
+    index_sync.order_changed()
     return {"status": "success"}
 
 @router.put("/categories/{category_id}", response_model=schemas.CategoryOut)
@@ -48,6 +72,7 @@ def update_category(category_id: int, category: schemas.CategoryUpdate, db: Sess
     
     db.commit()
     db.refresh(db_category)
+    index_sync.category_saved(db_category)
     return db_category
 
 @router.delete("/categories/{category_id}")
@@ -55,8 +80,12 @@ def delete_category(category_id: int, db: Session = Depends(get_db), current_use
     db_category = db.query(models.Category).filter(models.Category.id == category_id).first()
     if not db_category:
         raise HTTPException(status_code=404, detail="Category not found")
+    sub_ids = [sub.id for sub in db_category.sub_categories]
+    doc_ids = [doc.id for sub in db_category.sub_categories for doc in sub.documents]
+    delete_revisions(db, doc_ids)
     db.delete(db_category)
     db.commit()
+    index_sync.structure_deleted([category_id], sub_ids, doc_ids)
     return {"status": "success"}
 
 # --- SubCategories ---
@@ -67,13 +96,27 @@ def create_subcategory(subcategory: schemas.SubCategoryCreate, db: Session = Dep
     db.add(db_subcategory)
     db.commit()
     db.refresh(db_subcategory)
+    index_sync.subcategory_saved(db_subcategory)
     return db_subcategory
 
 @router.put("/subcategories/reorder")
 def reorder_subcategories(request: schemas.ReorderRequest, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    for index, sub_id in enumerate(request.ids):
-        db.query(models.SubCategory).filter(models.SubCategory.id == sub_id).update({"sort_order": index})
+    assign_order(db, models.SubCategory, request.ids)
+    db.commit()
+    index_sync.order_changed()
+    return {"status": "success"}
+
+@router.put("/subcategories/{subcategory_id}/move")
+def move_subcategory(subcategory_id: int, request: schemas.MoveRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    db_subcategory = db.query(models.SubCategory).filter(models.SubCategory.id == subcategory_id).first()
+    if not db_subcategory:
+        raise HTTPException(status_code=404, detail="SubCategory not found")
+
+    siblings = models.SubCategory.category_id == db_subcategory.category_id
+    if place_between(db, models.SubCategory, db_subcategory, siblings, request.after_id, request.before_id):
+        background_tasks.add_task(rebalance, models.SubCategory, siblings)
     db.commit()
+    index_sync.order_changed()
     return {"status": "success"}
 
 @router.put("/subcategories/{subcategory_id}", response_model=schemas.SubCategoryOut)
@@ -87,6 +130,7 @@ def update_subcategory(subcategory_id: int, subcategory: schemas.SubCategoryUpda
     
     db.commit()
     db.refresh(db_subcategory)
+    index_sync.subcategory_saved(db_subcategory)
     return db_subcategory
 
 @router.delete("/subcategories/{subcategory_id}")
@@ -94,18 +138,151 @@ def delete_subcategory(subcategory_id: int, db: Session = Depends(get_db), curre
     db_subcategory = db.query(models.SubCategory).filter(models.SubCategory.id == subcategory_id).first()
     if not db_subcategory:
         raise HTTPException(status_code=404, detail="SubCategory not found")
+    doc_ids = [doc.id for doc in db_subcategory.documents]
+    delete_revisions(db, doc_ids)
     db.delete(db_subcategory)
     db.commit()
+    index_sync.structure_deleted([], [subcategory_id], doc_ids)
     return {"status": "success"}
 
 # --- Tree Structure ---
 
-@router.get("/structure/tree", response_model=List[schemas.CategoryWithSubs])
-def read_structure_tree(db: Session = Depends(get_db)):
-    categories = db.query(models.Category).order_by(models.Category.sort_order).all()
-    # Ensure subcategories and documents are sorted
-    for cat in categories:
-        cat.sub_categories.sort(key=lambda x: x.sort_order)
-        for sub in cat.sub_categories:
-            sub.documents.sort(key=lambda x: x.sort_order)
-    return categories
+tree_adapter = TypeAdapter(List[schemas.TreeCategory])
+
+def build_tree(db: Session, public_only: bool = False) -> list:
+    """Whole navigation tree from one column-projected, pre-sorted join."""
+    doc_join = models.Document.sub_category_id == models.SubCategory.id
+    if public_only:
+        doc_join = doc_join & (models.Document.is_public == True)
+    rows = db.query(
+        models.Category.id.label("cat_id"),
+        models.Category.name.label("cat_name"),
+        models.Category.sort_order.label("cat_order"),
+        models.SubCategory.id.label("sub_id"),
+        models.SubCategory.name.label("sub_name"),
+        models.SubCategory.sort_order.label("sub_order"),
+        models.Document.id.label("doc_id"),
+        models.Document.title.label("doc_title"),
+        models.Document.sort_order.label("doc_order"),
+        models.Document.is_public.label("doc_public"),
+    ).outerjoin(
+        models.SubCategory, models.SubCategory.category_id == models.Category.id
+    ).outerjoin(
+        models.Document, doc_join
+    ).order_by(
+        models.Category.sort_order, models.Category.id,
+        models.SubCategory.sort_order, models.SubCategory.id,
+        models.Document.sort_order, models.Document.id,
+    ).all()
+
+    tree = []
+    category = sub = None
+    for row in rows:
+        if category is None or category["id"] != row.cat_id:
+            category = {"id": row.cat_id, "name": row.cat_name, "sort_order": row.cat_order, "sub_categories": []}
+            tree.append(category)
+            sub = None
+        if row.sub_id is None:
+            continue
+        if sub is None or sub["id"] != row.sub_id:
+            sub = {"id": row.sub_id, "category_id": row.cat_id, "name": row.sub_name, "sort_order": row.sub_order, "documents": []}
+            category["sub_categories"].append(sub)
+        if row.doc_id is not None:
+            sub["documents"].append({"id": row.doc_id, "title": row.doc_title, "sort_order": row.doc_order, "is_public": row.doc_public})
+    return tree
+
+@router.get("/structure/tree", response_model=List[schemas.TreeCategory])
+def read_structure_tree(request: Request, db: Session = Depends(get_db), current_user: Optional[models.User] = Depends(get_optional_user)):
+    # Anonymous visitors only see public documents; the tree is cached per audience
+    public_only = current_user is None
+    etag, body = tree_cache.get(
+        "public" if public_only else "member",
+        lambda: tree_adapter.dump_json(tree_adapter.validate_python(build_tree(db, public_only=public_only))),
+    )
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Authorization"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# --- Lazy Tree Branches ---
+
+def visible_documents_join(public_only: bool):
+    condition = models.Document.sub_category_id == models.SubCategory.id
+    if public_only:
+        condition = and_(condition, models.Document.is_public == True)
+    return condition
+
+@router.get("/structure/categories", response_model=List[schemas.CategorySummary])
+def read_category_summaries(db: Session = Depends(get_db), current_user: Optional[models.User] = Depends(get_optional_user)):
+    """Top level of the tree with child counts, for rendering the first screen."""
+    rows = db.query(
+        models.Category.id,
+        models.Category.name,
+        models.Category.sort_order,
+        func.count(func.distinct(models.SubCategory.id)).label("sub_category_count"),
+        func.count(models.Document.id).label("document_count"),
+    ).outerjoin(
+        models.SubCategory, models.SubCategory.category_id == models.Category.id
+    ).outerjoin(
+        models.Document, visible_documents_join(current_user is None)
+    ).group_by(models.Category.id).order_by(models.Category.sort_order, models.Category.id).all()
+    return [row._asdict() for row in rows]
+
+@router.get("/structure/categories/{category_id}/subcategories", response_model=List[schemas.SubCategorySummary])
+def read_subcategory_summaries(category_id: int, db: Session = Depends(get_db), current_user: Optional[models.User] = Depends(get_optional_user)):
+    if not db.query(models.Category.id).filter(models.Category.id == category_id).first():
+        raise HTTPException(status_code=404, detail="Category not found")
+    rows = db.query(
+        models.SubCategory.id,
+        models.SubCategory.category_id,
+        models.SubCategory.name,
+        models.SubCategory.sort_order,
+        func.count(models.Document.id).label("document_count"),
+    ).outerjoin(
+        models.Document, visible_documents_join(current_user is None)
+    ).filter(
+        models.SubCategory.category_id == category_id
+    ).group_by(models.SubCategory.id).order_by(models.SubCategory.sort_order, models.SubCategory.id).all()
+    return [row._asdict() for row in rows]
+
+@router.get("/structure/subcategories/{subcategory_id}/documents", response_model=schemas.TreeDocumentPage)
+def read_subcategory_documents(
+    subcategory_id: int,
+    limit: int = Query(50, ge=1, le=MAX_BRANCH_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: Optional[models.User] = Depends(get_optional_user)
+):
+    """One page of a subcategory's documents in sidebar order, keyset-paginated on (sort_order, id)."""
+    if not db.query(models.SubCategory.id).filter(models.SubCategory.id == subcategory_id).first():
+        raise HTTPException(status_code=404, detail="SubCategory not found")
+
+    sort_order = models.Document.sort_order
+    query = db.query(
+        models.Document.id,
+        models.Document.title,
+        sort_order,
+        models.Document.is_public,
+    ).filter(models.Document.sub_category_id == subcategory_id)
+    if current_user is None:
+        query = query.filter(models.Document.is_public == True)
+    if cursor:
+        last_order, last_id = decode_cursor(cursor, 2)
+        try:
+            last_id = int(last_id)
+            last_order = None if last_order is None else float(last_order)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if last_order is None:
+            # SQLite sorts NULL sort orders first
+            query = query.filter(or_(sort_order.isnot(None), models.Document.id > last_id))
+        else:
+            query = query.filter(or_(sort_order > last_order, and_(sort_order == last_order, models.Document.id > last_id)))
+
+    # Walks ix_documents_sub_category_sort in order, so a page costs limit rows
+    rows = query.order_by(sort_order, models.Document.id).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].sort_order, rows[-1].id)
+    return {"next_cursor": next_cursor, "items": [row._asdict() for row in rows]}
@@ -18,6 +18,15 @@ class UserOut(UserBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+# Author as embedded in documents: only what the document view shows,
+# so logins don't change (and invalidate) every document of the author
+class AuthorOut(UserBase):
+    id: int
+    role: str
+    avatar: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -51,6 +60,58 @@ class DocumentOut(DocumentBase):
 class ReorderRequest(BaseModel):
     ids: List[int]
 
+# Pre-rendered document (GET /docs/{id}?format=html)
+class TocEntry(BaseModel):
+    id: str
+    text: str
+    level: int
+
+class DocumentHtmlOut(BaseModel):
+    id: int
+    title: str
+    is_public: bool
+    sub_category_id: int
+    sort_order: Optional[int] = 0
+    author_id: int
+    created_at: datetime
+    updated_at: datetime
+    author: Optional[AuthorOut] = None
+    category_name: Optional[str] = None
+    sub_category_name: Optional[str] = None
+    version: Optional[int] = None
+    html: str
+    toc: List[TocEntry] = []
+
+    model_config = ConfigDict(from_attributes=True)
+
+# Revision History
+class RevisionOut(BaseModel):
+    number: int
+    kind: str
+    title: Optional[str] = None
+    author_id: Optional[int] = None
+    author_name: Optional[str] = None
+    size: Optional[int] = None
+    stored_size: int
+    created_at: datetime
+
+class RevisionDetail(BaseModel):
+    number: int
+    title: Optional[str] = None
+    content: str
+    author_id: Optional[int] = None
+    created_at: datetime
+
+class RevisionDiff(BaseModel):
+    from_number: int
+    to_number: int
+    diff: str # unified diff of the Markdown source
+
+# Drag-and-drop move: the item lands after after_id and before before_id (None = list end)
+class MoveRequest(BaseModel):
+    after_id: Optional[int] = None
+    before_id: Optional[int] = None
+
 # Category/SubCategory Schemas
 class SubCategoryBase(BaseModel):
     name: str
@@ -87,6 +148,40 @@ class CategoryOut(CategoryBase):
 class CategoryWithSubs(CategoryOut):
     sub_categories: List[SubCategoryOut] = []
 
+# Navigation tree: only what the sidebar renders, no document bodies
+class TreeDocument(BaseModel):
+    id: int
+    title: str
+    sort_order: Optional[int] = 0
+    is_public: bool
+
+class TreeSubCategory(BaseModel):
+    id: int
+    category_id: int
+    name: str
+    sort_order: Optional[int] = 0
+    documents: List[TreeDocument] = []
+
+class TreeCategory(BaseModel):
+    id: int
+    name: str
+    sort_order: Optional[int] = 0
+    sub_categories: List[TreeSubCategory] = []
+
+# Lazy tree branches
+class CategorySummary(CategoryOut):
+    sub_category_count: int
+    document_count: int
+
+class SubCategorySummary(SubCategoryBase):
+    id: int
+    category_id: int
+    document_count: int
+
+class TreeDocumentPage(BaseModel):
+    next_cursor: Optional[str] = None
+    items: List[TreeDocument] = []
+
 # Document Schemas
 class DocumentBase(BaseModel):
     title: str
@@ -106,19 +201,71 @@ class DocumentOut(DocumentBase):
     author_id: int
     created_at: datetime
     updated_at: datetime
-    author: Optional[UserOut] = None
+    author: Optional[AuthorOut] = None
     category_name: Optional[str] = None
     sub_category_name: Optional[str] = None
+    version: Optional[int] = None
 
     model_config = ConfigDict(from_attributes=True)
 
+# Partial update (PATCH /docs/{id}): only the fields sent are written.
+# Content is either replaced whole or edited with splices against base_version.
+class TextEdit(BaseModel):
+    start: int # [start, end) offsets into the base content, in code points (not UTF-16 units)
+    end: int
+    text: str = ""
+
+class DocumentPatch(BaseModel):
+    title: Optional[str] = None
+    is_public: Optional[bool] = None
+    sub_category_id: Optional[int] = None
+    sort_order: Optional[int] = None
+    content: Optional[str] = None
+    edits: Optional[List[TextEdit]] = None
+    base_version: Optional[int] = None
+
+# Bulk document operations (one transaction each)
+class BulkIds(BaseModel):
+    ids: List[int]
+
+class BulkCreate(BaseModel):
+    documents: List[DocumentCreate]
+
+class BulkUpdate(BaseModel):
+    ids: List[int]
+    sub_category_id: Optional[int] = None # move, appended after the target's documents
+    is_public: Optional[bool] = None
+
+class BulkResult(BaseModel):
+    count: int
+    ids: List[int]
+
 # Search Response
+class SearchSnippet(BaseModel):
+    text: str
+    highlights: List[List[int]] = [] # [start, end) offsets into text, in code points (not UTF-16 units)
+
 class SearchResult(BaseModel):
     id: int
     title: str
-    content: Optional[str] = None
+    content: Optional[str] = None # Only sent when include_content=true
     category_name: Optional[str] = None
     sub_category_name: Optional[str] = None
     snippet: Optional[str] = None
+    snippets: List[SearchSnippet] = []
+    title_highlights: List[List[int]] = [] # same unit as SearchSnippet.highlights
     is_public: bool
     updated_at: datetime
+
+class SearchPage(BaseModel):
+    total: int # All matching documents, even beyond the paging cap
+    next_cursor: Optional[str] = None
+    mode: str = "fts" # Mode that produced the hits; "fuzzy" after a fallback
+    items: List[SearchResult] = []
+
+class Suggestion(BaseModel):
+    type: str # doc, category, subcategory
+    id: int
+    name: str
+    category_id: Optional[int] = None
+    sub_category_id: Optional[int] = None
@@ -0,0 +1,62 @@
+import itertools
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+# The app keeps its SQLite file and uploads relative to the working directory
+os.chdir(tempfile.mkdtemp(prefix="addoc-tests-"))
+
+from fastapi.testclient import TestClient
+
+from database import engine
+from main import app
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture(scope="session")
+def headers(client):
+    response = client.post("/api/token", data={"username": "admin", "password": "123456"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+@pytest.fixture(scope="session")
+def other_admin_headers(client, headers):
+    user = client.post("/api/users/", json={"username": "second-admin", "password": "123456"}, headers=headers).json()
+    client.put(f"/api/users/{user['id']}/role", json={"role": "admin"}, headers=headers)
+    response = client.post("/api/token", data={"username": "second-admin", "password": "123456"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+_names = itertools.count(1)
+
+@pytest.fixture
+def sub_category(client, headers):
+    name = f"Tests {next(_names)}"
+    category = client.post("/api/categories", json={"name": name}, headers=headers).json()
+    return client.post("/api/subcategories", json={"name": name, "category_id": category["id"]}, headers=headers).json()
+
+@pytest.fixture
+def db_engine():
+    return engine
+
+@pytest.fixture
+def capture_statements(db_engine):
+    """with capture_statements() as statements: every SQL statement run inside the block."""
+    @contextmanager
+    def capture():
+        statements = []
+        def listener(conn, cursor, statement, *args):
+            statements.append(statement)
+        event.listen(db_engine, "before_cursor_execute", listener)
+        try:
+            yield statements
+        finally:
+            event.remove(db_engine, "before_cursor_execute", listener)
+    return capture
@@ -0,0 +1,75 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from database import SessionLocal
+import models
+from utils.autosave import autosave_buffer
+
+def create(client, headers, sub_category, content):
+    return client.post("/api/docs", json={"title": "draft", "content": content, "sub_category_id": sub_category["id"]}, headers=headers).json()
+
+def stage(client, headers, doc, content):
+    return client.post(f"/api/docs/{doc['id']}/autosave", json={"base_version": doc["version"], "content": content}, headers=headers)
+
+def fail_document_updates(conn, cursor, statement, *args):
+    if statement.startswith("UPDATE documents"):
+        raise RuntimeError("disk full")
+
+@contextmanager
+def failing_document_updates(engine):
+    event.listen(engine, "before_cursor_execute", fail_document_updates)
+    try:
+        yield
+    finally:
+        event.remove(engine, "before_cursor_execute", fail_document_updates)
+
+def test_flushed_draft_is_dropped_and_session_continues(client, headers, sub_category):
+    doc = create(client, headers, sub_category, "")
+    base = doc["version"]
+
+    response = client.post(f"/api/docs/{doc['id']}/autosave", json={"base_version": base, "edits": [{"start": 0, "end": 0, "text": "ab"}]}, headers=headers)
+    assert response.status_code == 202
+    autosave_buffer.flush(doc["id"])
+    assert doc["id"] not in autosave_buffer._drafts
+
+    # The editor keeps sending the version it loaded
+    response = client.post(f"/api/docs/{doc['id']}/autosave", json={"base_version": base, "edits": [{"start": 2, "end": 2, "text": "c"}]}, headers=headers)
+    assert response.status_code == 202
+    saved = client.post(f"/api/docs/{doc['id']}/flush", headers=headers).json()
+    assert saved["content"] == "abc"
+    assert doc["id"] not in autosave_buffer._drafts
+
+def test_failed_flush_keeps_the_draft_and_reports_it(client, headers, sub_category, db_engine):
+    doc = create(client, headers, sub_category, "hello")
+    assert stage(client, headers, doc, "hello world").status_code == 202
+
+    with failing_document_updates(db_engine):
+        assert client.post(f"/api/docs/{doc['id']}/flush", headers=headers).status_code == 503
+    draft = autosave_buffer._drafts[doc["id"]]
+    assert draft.changes["content"] == "hello world"
+    assert draft.timer is not None # retried after another window
+    autosave_buffer.discard(doc["id"])
+
+def test_stage_does_not_spin_on_another_users_unwritable_draft(client, headers, other_admin_headers, sub_category, db_engine):
+    doc = create(client, headers, sub_category, "a")
+    assert stage(client, headers, doc, "mine").status_code == 202
+
+    with failing_document_updates(db_engine):
+        assert stage(client, other_admin_headers, doc, "theirs").status_code == 503
+    assert client.post(f"/api/docs/{doc['id']}/flush", headers=headers).json()["content"] == "mine"
+
+def test_stale_draft_does_not_overwrite_a_newer_save(client, headers, sub_category):
+    doc = create(client, headers, sub_category, "a")
+    assert stage(client, headers, doc, "autosaved").status_code == 202
+
+    # A save from another worker process lands before the draft is written
+    db = SessionLocal()
+    stored = db.query(models.Document).filter(models.Document.id == doc["id"]).first()
+    stored.content, stored.version = "saved elsewhere", stored.version + 1
+    db.commit()
+    db.close()
+
+    assert client.post(f"/api/docs/{doc['id']}/flush", headers=headers).status_code == 409
+    assert client.get(f"/api/docs/{doc['id']}", headers=headers).json()["content"] == "saved elsewhere"
+    assert doc["id"] not in autosave_buffer._drafts
@@ -0,0 +1,34 @@
+import pytest
+from sqlalchemy import event
+
+from database import SessionLocal
+import models
+
+def fail_activity_inserts(conn, cursor, statement, parameters, context, executemany):
+    if statement.startswith("INSERT INTO activity_logs"):
+        raise RuntimeError("activity log unavailable")
+
+@pytest.fixture
+def failing_activity_log(db_engine):
+    event.listen(db_engine, "before_cursor_execute", fail_activity_inserts)
+    yield
+    event.remove(db_engine, "before_cursor_execute", fail_activity_inserts)
+
+def activity_count():
+    db = SessionLocal()
+    try:
+        return db.query(models.ActivityLog).count()
+    finally:
+        db.close()
+
+def test_bulk_create_keeps_documents_when_logging_fails(client, headers, sub_category, failing_activity_log):
+    logged = activity_count()
+    documents = [{"title": f"bulk {i}", "content": "body", "sub_category_id": sub_category["id"]} for i in range(3)]
+    response = client.post("/api/docs/bulk", json={"documents": documents}, headers=headers)
+
+    assert response.status_code == 200
+    ids = response.json()["ids"]
+    assert len(ids) == 3
+    fetched = client.post("/api/docs/bulk/fetch", json={"ids": ids}, headers=headers).json()
+    assert [doc["id"] for doc in fetched] == ids
+    assert activity_count() == logged
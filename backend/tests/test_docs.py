@@ -0,0 +1,50 @@
+from database import SessionLocal
+from routers.docs import load_document
+
+def create_public(client, headers, sub_category):
+    return client.post("/api/docs", json={"title": "one query", "content": "# body", "is_public": True, "sub_category_id": sub_category["id"]}, headers=headers).json()
+
+def test_load_document_is_one_query(client, headers, sub_category, capture_statements):
+    doc = create_public(client, headers, sub_category)
+    db = SessionLocal()
+    try:
+        with capture_statements() as statements:
+            document = load_document(db, doc["id"])
+            # Breadcrumb and author come with the document, not as lazy loads
+            assert (document.category_name, document.sub_category_name) == (sub_category["name"], sub_category["name"])
+            assert document.author.username == "admin"
+            assert document.content == "# body"
+        assert len(statements) == 1
+    finally:
+        db.close()
+
+def test_read_document_is_one_query(client, headers, sub_category, capture_statements):
+    doc = create_public(client, headers, sub_category)
+    for format in ("markdown", "html"):
+        with capture_statements() as statements:
+            response = client.get(f"/api/docs/{doc['id']}", params={"format": format})
+        assert response.status_code == 200
+        assert len(statements) == 1
+
+def test_revalidation_skips_the_body(client, headers, sub_category, capture_statements):
+    doc = create_public(client, headers, sub_category)
+    etag = client.get(f"/api/docs/{doc['id']}").headers["etag"]
+    with capture_statements() as statements:
+        response = client.get(f"/api/docs/{doc['id']}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert len(statements) == 1
+    assert "documents.content" not in statements[0]
+
+def test_breadcrumb_rename_invalidates_and_login_does_not(client, headers, sub_category):
+    doc = create_public(client, headers, sub_category)
+    first = client.get(f"/api/docs/{doc['id']}")
+    assert "last-modified" not in first.headers
+    etag = first.headers["etag"]
+
+    client.post("/api/token", data={"username": "admin", "password": "123456"})
+    assert client.get(f"/api/docs/{doc['id']}", headers={"If-None-Match": etag}).status_code == 304
+
+    client.put(f"/api/subcategories/{sub_category['id']}", json={"name": "Renamed"}, headers=headers)
+    response = client.get(f"/api/docs/{doc['id']}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["sub_category_name"] == "Renamed"
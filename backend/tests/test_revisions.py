@@ -0,0 +1,54 @@
+import json
+
+from database import SessionLocal
+import models
+
+def create(client, headers, sub_category):
+    return client.post("/api/docs", json={"title": "history", "content": "v1", "sub_category_id": sub_category["id"]}, headers=headers).json()
+
+def revision_count(doc_id):
+    db = SessionLocal()
+    try:
+        return db.query(models.DocumentRevision).filter(models.DocumentRevision.document_id == doc_id).count()
+    finally:
+        db.close()
+
+def test_put_racing_on_revision_number_is_a_conflict(client, headers, sub_category):
+    doc = create(client, headers, sub_category)
+    # What a concurrent save would have committed first
+    db = SessionLocal()
+    db.add(models.DocumentRevision(document_id=doc["id"], number=doc["version"] + 1, kind="snapshot", title="other", size=0, data=b""))
+    db.commit()
+    db.close()
+
+    body = {"title": "history", "content": "v2", "sub_category_id": sub_category["id"]}
+    response = client.put(f"/api/docs/{doc['id']}", json=body, headers=headers)
+    assert response.status_code == 409
+    assert response.json()["detail"]["version"] == doc["version"]
+
+def test_delete_removes_revisions_without_loading_them(client, headers, sub_category, capture_statements):
+    doc = create(client, headers, sub_category)
+    body = {"title": "history", "content": "v2", "sub_category_id": sub_category["id"]}
+    client.put(f"/api/docs/{doc['id']}", json=body, headers=headers)
+    assert revision_count(doc["id"]) == 2
+
+    with capture_statements() as statements:
+        assert client.delete(f"/api/docs/{doc['id']}", headers=headers).status_code == 200
+    assert not any(s.startswith("SELECT") and "FROM document_revisions" in s for s in statements)
+    assert revision_count(doc["id"]) == 0
+
+def test_edits_count_code_points(client, headers, sub_category):
+    doc = client.post("/api/docs", json={"title": "emoji", "content": "😀ac", "sub_category_id": sub_category["id"]}, headers=headers).json()
+    patch = {"base_version": doc["version"], "edits": [{"start": 2, "end": 2, "text": "b"}]}
+    response = client.patch(f"/api/docs/{doc['id']}", json=patch, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["content"] == "😀abc"
+
+def test_edits_producing_lone_surrogates_are_rejected(client, headers, sub_category):
+    doc = client.post("/api/docs", json={"title": "emoji", "content": "😀", "sub_category_id": sub_category["id"]}, headers=headers).json()
+    # What a UTF-16 diff of 😀 -> 😁 sends: the low surrogate alone
+    patch = {"base_version": doc["version"], "edits": [{"start": 0, "end": 1, "text": "\ud83d"}]}
+    response = client.patch(f"/api/docs/{doc['id']}", content=json.dumps(patch), headers={**headers, "Content-Type": "application/json"})
+    assert response.status_code == 400
+    response = client.post(f"/api/docs/{doc['id']}/autosave", content=json.dumps(patch), headers={**headers, "Content-Type": "application/json"})
+    assert response.status_code == 400
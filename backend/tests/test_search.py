@@ -0,0 +1,41 @@
+def create(client, headers, sub_category, title, content):
+    return client.post("/api/docs", json={"title": title, "content": content, "is_public": True, "sub_category_id": sub_category["id"]}, headers=headers).json()
+
+def test_short_cjk_terms_use_the_ngram_index(client, headers, sub_category, capture_statements):
+    create(client, headers, sub_category, "容器网络", "docker 网络 配置")
+    with capture_statements() as statements:
+        page = client.get("/api/search", params={"q": "网络", "sub_category_id": sub_category["id"]}).json()
+
+    assert [item["title"] for item in page["items"]] == ["容器网络"]
+    assert not any("LIKE" in statement.upper() for statement in statements)
+
+def test_fuzzy_fallback_keeps_cjk_terms(client, headers, sub_category):
+    create(client, headers, sub_category, "docker 网络", "容器 docker network")
+    create(client, headers, sub_category, "部署 guide", "部署 kubernetes")
+    params = {"sub_category_id": sub_category["id"]}
+
+    assert client.get("/api/search", params={"q": "部署 dockr", **params}).json()["total"] == 0
+    page = client.get("/api/search", params={"q": "部署 kubernets", **params}).json()
+    assert [item["title"] for item in page["items"]] == ["部署 guide"]
+
+def test_cache_stats_require_admin(client, headers):
+    assert client.get("/api/search/cache-stats").status_code == 401
+    assert client.get("/api/search/cache-stats", headers=headers).status_code == 200
+
+def test_content_pages_are_not_cached(client, headers, sub_category):
+    create(client, headers, sub_category, "cached body", "a cacheable body")
+    params = {"q": "cacheable", "sub_category_id": sub_category["id"]}
+    entries = lambda: client.get("/api/search/cache-stats", headers=headers).json()["entries"]
+
+    before = entries()
+    client.get("/api/search", params={**params, "include_content": True})
+    assert entries() == before
+    client.get("/api/search", params=params)
+    assert entries() == before + 1
+
+def test_fuzzy_mode_answers_cjk_only_queries(client, headers, sub_category):
+    create(client, headers, sub_category, "数据库设计", "表结构与索引")
+    params = {"q": "数据库", "sub_category_id": sub_category["id"]}
+    for mode in ("fts", "ngram", "fuzzy"):
+        page = client.get("/api/search", params={**params, "mode": mode}).json()
+        assert [item["title"] for item in page["items"]] == ["数据库设计"], mode
@@ -0,0 +1,12 @@
+from utils.snippet import MAX_HIGHLIGHTS, MAX_WINDOW_LENGTH, MAX_WINDOWS, build_snippets
+
+def test_hit_dense_text_stays_bounded():
+    text = "docker 网络 " * 2000
+    snippets = build_snippets(text, ["docker", "网络"])
+
+    assert len(snippets) == MAX_WINDOWS
+    for snippet in snippets:
+        assert len(snippet["text"]) <= MAX_WINDOW_LENGTH + 2 * len("...")
+        assert len(snippet["highlights"]) <= MAX_HIGHLIGHTS
+        for start, end in snippet["highlights"]:
+            assert snippet["text"][start:end] in ("docker", "网络")
@@ -0,0 +1,18 @@
+from utils.cursor import encode_cursor
+
+def test_branch_page_rejects_malformed_cursor(client, headers, sub_category):
+    url = f"/api/structure/subcategories/{sub_category['id']}/documents"
+    for values in ([{"a": 1}, 1], [1, "x"], [1, None]):
+        response = client.get(url, params={"cursor": encode_cursor(*values)}, headers=headers)
+        assert response.status_code == 400
+
+def test_branch_pages_follow_cursor(client, headers, sub_category):
+    ids = [
+        client.post("/api/docs", json={"title": f"page {i}", "content": "", "sub_category_id": sub_category["id"]}, headers=headers).json()["id"]
+        for i in range(3)
+    ]
+    url = f"/api/structure/subcategories/{sub_category['id']}/documents"
+    first = client.get(url, params={"limit": 2}, headers=headers).json()
+    second = client.get(url, params={"limit": 2, "cursor": first["next_cursor"]}, headers=headers).json()
+    assert [item["id"] for item in first["items"] + second["items"]] == ids
+    assert second["next_cursor"] is None
@@ -0,0 +1,216 @@
+"""
+Write-behind buffer for editor autosaves.
+
+Autosaves for a document are held in memory and written together: one
+commit, one revision and one activity entry per flush. A flush happens
+AUTOSAVE_WINDOW_SECONDS after the first buffered save (so at most that
+much typing can be lost on a crash), on an explicit flush ("save and
+close"), before any regular PUT/PATCH of the document, and at shutdown.
+
+Each document has at most one draft, owned by the user who is
+autosaving it, and a draft is dropped once it is flushed. The client
+keeps sending the base_version it loaded; flushes made by its own
+editing session don't make that base stale (the versions of recently
+flushed drafts are remembered for this, not their content).
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+import models
+from utils import index_sync
+from utils.logger import log_activity
+from utils.revisions import apply_edits, record_revision
+
+AUTOSAVE_WINDOW_SECONDS = float(os.environ.get("ADDOC_AUTOSAVE_WINDOW", "5"))
+# Flushed drafts are dropped; their versions are remembered this long (in documents)
+MAX_FLUSHED_SESSIONS = 1024
+
+# Outcomes of writing a draft
+WRITTEN = "written" # stored, or nothing to store
+FAILED = "failed" # still buffered, retried when the timer fires again
+CONFLICT = "conflict" # the document changed under the draft; its changes were dropped
+
+class Draft:
+    def __init__(self, doc_id: int, user_id: int, start_version: int, version: int, content: str):
+        self.doc_id = doc_id
+        self.user_id = user_id
+        self.start_version = start_version # what the client sends as base_version
+        self.version = version # documents.version after this draft's last flush
+        self.content = content # latest content, buffered or flushed
+        self.changes = {} # fields not written yet
+        self.saves = 0 # autosaves folded into the pending changes
+        self.timer: Optional[threading.Timer] = None
+        # Held for the whole DB write of this draft
+        self.writing = threading.Lock()
+
+class AutosaveBuffer:
+    def __init__(self, window: float = AUTOSAVE_WINDOW_SECONDS):
+        self.window = window
+        self._drafts: Dict[int, Draft] = {}
+        # doc_id -> (user_id, start_version, version) of drafts dropped after their flush
+        self._flushed: "OrderedDict[int, Tuple[int, int, int]]" = OrderedDict()
+        # Guards the in-memory state only, never held across a DB write;
+        # a draft's writing lock is always taken before this one
+        self._lock = threading.Lock()
+
+    def stage(self, db: Session, document: models.Document, user_id: int, patch) -> dict:
+        """Buffer a schemas.DocumentPatch for document; nothing is written here."""
+        while True:
+            with self._lock:
+                draft = self._drafts.get(document.id)
+                flushed = self._flushed.get(document.id)
+                if draft is None and flushed is not None and flushed[2] > (document.version or 0):
+                    pass # document was loaded before the last flush landed
+                elif draft is None or (draft.user_id == user_id and not draft.writing.locked()):
+                    return self._stage(document, user_id, patch, draft, flushed)
+            if draft is not None and draft.user_id != user_id:
+                # Someone else's draft lands first; the caller's base is checked against it
+                if self._flush(draft) == FAILED:
+                    raise HTTPException(status_code=503, detail="Another user's pending autosave could not be written; try again")
+            elif draft is not None:
+                # Our own flush is in flight: wait for it
+                with draft.writing:
+                    pass
+            db.refresh(document)
+
+    def _stage(self, document: models.Document, user_id: int, patch, draft: Optional[Draft], flushed) -> dict:
+        current_version = document.version or 0
+        if draft is None and flushed is not None and flushed[0] == user_id and flushed[2] == current_version:
+            # The same editing session after a flush dropped its draft
+            draft = Draft(document.id, user_id, flushed[1], current_version, document.content or "")
+        continuing = (
+            draft is not None
+            and draft.version == current_version
+            and patch.base_version in (None, draft.start_version, draft.version)
+        )
+        if not continuing:
+            if patch.base_version is not None and patch.base_version != current_version:
+                raise HTTPException(status_code=409, detail={"message": "Document was changed since base_version", "version": current_version})
+            if patch.edits is not None and patch.base_version is None:
+                raise HTTPException(status_code=400, detail="edits require base_version")
+            if draft is not None and draft.timer is not None:
+                draft.timer.cancel()
+            draft = Draft(document.id, user_id, current_version, current_version, document.content or "")
+
+        changes = {
+            key: value
+            for key, value in patch.model_dump(exclude_unset=True, exclude={"edits", "base_version"}).items()
+            if value is not None
+        }
+        if patch.edits is not None:
+            if "content" in changes:
+                raise HTTPException(status_code=400, detail="Send either content or edits, not both")
+            changes["content"] = apply_edits(draft.content, patch.edits)
+        if "content" in changes:
+            draft.content = changes["content"]
+        draft.changes.update(changes)
+        draft.saves += 1
+        self._drafts[document.id] = draft
+        self._flushed.pop(document.id, None)
+
+        self._arm(draft)
+        return {"status": "buffered", "saves": draft.saves, "version": draft.start_version, "flush_in": self.window}
+
+    def _arm(self, draft: Draft):
+        # Caller holds self._lock
+        if draft.timer is None:
+            draft.timer = threading.Timer(self.window, self.flush, args=(draft.doc_id,))
+            draft.timer.daemon = True
+            draft.timer.start()
+
+    def flush(self, doc_id: int) -> str:
+        with self._lock:
+            draft = self._drafts.get(doc_id)
+        return self._flush(draft) if draft is not None else WRITTEN
+
+    def close(self, doc_id: int):
+        """
+        Save and close: write pending changes and end the draft. If they can't
+        be written the draft is kept (and retried) and the caller gets an error.
+        """
+        result = self.flush(doc_id)
+        if result == FAILED:
+            raise HTTPException(status_code=503, detail="Autosaved changes could not be written; they are kept and retried")
+        self.discard(doc_id)
+        if result == CONFLICT:
+            raise HTTPException(status_code=409, detail="Document was changed by another save; autosaved changes were dropped")
+
+    def discard(self, doc_id: int):
+        with self._lock:
+            draft = self._drafts.pop(doc_id, None)
+            self._flushed.pop(doc_id, None)
+            if draft is not None and draft.timer is not None:
+                draft.timer.cancel()
+
+    def flush_all(self):
+        with self._lock:
+            doc_ids = list(self._drafts)
+        for doc_id in doc_ids:
+            try:
+                self.close(doc_id)
+            except HTTPException as e:
+                print(f"Autosave for document {doc_id} not saved at shutdown: {e.detail}")
+
+    def _flush(self, draft: Draft) -> str:
+        """Write draft, then drop it unless the write failed and left changes behind."""
+        with draft.writing:
+            result = self._write(draft)
+            with self._lock:
+                if self._drafts.get(draft.doc_id) is draft and result != FAILED:
+                    del self._drafts[draft.doc_id]
+                    if result == WRITTEN:
+                        self._flushed[draft.doc_id] = (draft.user_id, draft.start_version, draft.version)
+                        while len(self._flushed) > MAX_FLUSHED_SESSIONS:
+                            self._flushed.popitem(last=False)
+        return result
+
+    def _write(self, draft: Draft) -> str:
+        with self._lock:
+            if draft.timer is not None:
+                draft.timer.cancel()
+                draft.timer = None
+            changes, saves = draft.changes, draft.saves
+            draft.changes, draft.saves = {}, 0
+        if not changes:
+            return WRITTEN
+
+        db = SessionLocal()
+        try:
+            document = db.query(models.Document).filter(models.Document.id == draft.doc_id).first()
+            if document is None:
+                return WRITTEN
+            if (document.version or 0) != draft.version:
+                # A PUT/PATCH landed since the draft was based; don't overwrite it
+                print(f"Autosave for document {draft.doc_id} dropped: version {draft.version} is stale")
+                return CONFLICT
+            previous, previous_title = document.content, document.title
+            for key, value in changes.items():
+                if getattr(document, key) != value:
+                    setattr(document, key, value)
+            if document.content != previous or document.title != previous_title:
+                record_revision(db, document, draft.user_id, previous, previous_title)
+            log_activity(db, draft.user_id, "update", document.id, "doc",
+                         f"Updated document: {document.title} ({saves} autosaves)", commit=False)
+            db.commit()
+            draft.version = document.version or 0
+            index_sync.document_saved(document)
+            return WRITTEN
+        except Exception as e:
+            # Keep the changes buffered and retry them after another window
+            print(f"Autosave flush failed: {e}")
+            db.rollback()
+            with self._lock:
+                draft.changes = {**changes, **draft.changes}
+                draft.saves += saves
+                self._arm(draft)
+            return FAILED
+        finally:
+            db.close()
+
+autosave_buffer = AutosaveBuffer()
@@ -0,0 +1,76 @@
+"""
+Transparent at-rest compression for large text columns.
+
+CompressedText columns store values longer than COMPRESS_THRESHOLD bytes
+as a zlib BLOB (SQLite columns accept either type) and return str on
+read, so ORM and Core code above the column never sees the difference.
+Smaller values stay plain TEXT.
+
+zlib is primed with a preset dictionary of Markdown, code and common
+Chinese fragments, which helps most on mid-sized documents where a cold
+compressor has no history yet. The dictionary is versioned in the
+header; add a new version instead of editing an old one, or stored
+values become unreadable.
+"""
+import os
+import zlib
+
+from sqlalchemy.types import Text, TypeDecorator
+
+# UTF-8 byte length above which values are compressed; 0 disables compression
+COMPRESS_THRESHOLD = int(os.environ.get("ADDOC_COMPRESS_THRESHOLD", "4096"))
+# Only keep the compressed form if it saves at least this fraction
+MIN_SAVING = 0.1
+
+MAGIC = b"\x1fZ"
+
+# zlib favours matches near the end of the dictionary: most common last
+DICTIONARIES = {
+    1: "".join([
+        "<details><summary></summary></details><br><img src=\"\" alt=\"\">",
+        "| --- | --- | --- |\n| :--- | :---: | ---: |\n",
+        "- [ ] - [x] > **注意**：> **提示**：",
+        "http://localhost:8000 http://127.0.0.1 https://github.com/ https://",
+        "sudo apt-get install -y pip install npm install docker compose up -d docker run -it --rm ",
+        "```bash\n```shell\n```json\n```yaml\n```sql\n```javascript\n```typescript\n```python\n```\n",
+        "SELECT * FROM WHERE ORDER BY GROUP BY INSERT INTO VALUES UPDATE SET ",
+        "export default import { } from ' const let function async await return console.log(",
+        "from import def self, return None True False if __name__ == \"__main__\": print(",
+        "如果 需要 可以 使用 通过 进行 配置 文件 命令 安装 运行 服务 数据库 接口 参数 返回 问题 解决 方法 ",
+        "我们 这个 一个 以及 其中 例如 注意 然后 首先 最后 所以 因为 但是 已经 没有 这样 ",
+        "](/uploads/![](/uploads/ ![image](/uploads/",
+        "\n\n### \n\n## \n\n# \n\n- \n\n1. \n\n**",
+        "的，。、：；（）“”",
+    ]).encode("utf-8"),
+}
+CURRENT_DICTIONARY = 1
+
+def compress_text(value: str):
+    """bytes for values worth compressing, else the str unchanged."""
+    if value is None or COMPRESS_THRESHOLD <= 0:
+        return value
+    raw = value.encode("utf-8")
+    if len(raw) <= COMPRESS_THRESHOLD:
+        return value
+    compressor = zlib.compressobj(level=6, zdict=DICTIONARIES[CURRENT_DICTIONARY])
+    packed = MAGIC + bytes([CURRENT_DICTIONARY]) + compressor.compress(raw) + compressor.flush()
+    return packed if len(packed) <= len(raw) * (1 - MIN_SAVING) else value
+
+def decompress_text(value):
+    if not isinstance(value, (bytes, bytearray, memoryview)):
+        return value
+    value = bytes(value)
+    if not value.startswith(MAGIC):
+        return value.decode("utf-8")
+    decompressor = zlib.decompressobj(zdict=DICTIONARIES[value[len(MAGIC)]])
+    return (decompressor.decompress(value[len(MAGIC) + 1:]) + decompressor.flush()).decode("utf-8")
+
+class CompressedText(TypeDecorator):
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
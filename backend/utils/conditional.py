@@ -0,0 +1,14 @@
+import hashlib
+
+from fastapi import Request
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag in candidates or "*" in candidates
+
+def make_etag(*parts) -> str:
+    """Strong ETag from the values a response is built from."""
+    return '"' + hashlib.sha1("\x1f".join(str(p) for p in parts).encode()).hexdigest()[:20] + '"'
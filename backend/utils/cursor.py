@@ -0,0 +1,17 @@
+import base64
+import json
+
+from fastapi import HTTPException
+
+def encode_cursor(*values) -> str:
+    """Opaque keyset cursor holding the sort key of the last row served."""
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode()
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
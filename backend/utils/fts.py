@@ -0,0 +1,84 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+# External-content FTS5 table over documents(title, plain_text).
+# The trigram tokenizer gives substring matching (same semantics as the old
+# ILIKE '%q%' scan) and works for Chinese text, which has no word boundaries.
+FTS_TABLE = "documents_fts"
+
+# Trigram tokenizer cannot match terms shorter than 3 characters
+MIN_TERM_LENGTH = 3
+
+# bm25() weights per indexed column: a title hit counts more than a body hit
+BM25_WEIGHTS = (10.0, 1.0)
+
+FTS_DDL = (
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    "title, plain_text, content='documents', content_rowid='id', tokenize='trigram')"
+)
+
+FTS_TRIGGERS = {
+    "documents_fts_ai": f"""
+        CREATE TRIGGER documents_fts_ai AFTER INSERT ON documents BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, title, plain_text)
+            VALUES (new.id, new.title, new.plain_text);
+        END""",
+    "documents_fts_ad": f"""
+        CREATE TRIGGER documents_fts_ad AFTER DELETE ON documents BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, plain_text)
+            VALUES ('delete', old.id, old.title, old.plain_text);
+        END""",
+    "documents_fts_au": f"""
+        CREATE TRIGGER documents_fts_au AFTER UPDATE OF title, plain_text ON documents BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, plain_text)
+            VALUES ('delete', old.id, old.title, old.plain_text);
+            INSERT INTO {FTS_TABLE}(rowid, title, plain_text)
+            VALUES (new.id, new.title, new.plain_text);
+        END""",
+}
+
+fts_enabled = False
+
+def init_fts(engine: Engine) -> bool:
+    """
+    Create the FTS table and its sync triggers if missing (or outdated),
+    and rebuild the index once from the documents table when that happens.
+    Returns False if this SQLite build has no FTS5/trigram support.
+    """
+    global fts_enabled
+    with engine.begin() as conn:
+        existing = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE},
+        ).scalar()
+        if existing == FTS_DDL:
+            fts_enabled = True
+            return fts_enabled
+
+        try:
+            for trigger in FTS_TRIGGERS:
+                conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+            conn.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+            conn.execute(text(FTS_DDL))
+        except Exception as e:
+            print(f"FTS5 unavailable, search falls back to LIKE scans: {e}")
+            fts_enabled = False
+            return fts_enabled
+
+        for ddl in FTS_TRIGGERS.values():
+            conn.execute(text(ddl))
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        print("--- Search index rebuilt ---")
+
+    fts_enabled = True
+    return fts_enabled
+
+def split_terms(q: str) -> list:
+    return [term for term in q.split() if term]
+
+def can_use_fts(terms: list) -> bool:
+    return fts_enabled and bool(terms) and all(len(term) >= MIN_TERM_LENGTH for term in terms)
+
+def build_match_query(terms: list) -> str:
+    # Quote every term so FTS5 operators/punctuation in user input are literal
+    return " AND ".join('"' + term.replace('"', '""') + '"' for term in terms)
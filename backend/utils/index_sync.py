@@ -0,0 +1,63 @@
+"""
+Keeps the in-process indexes and caches in step with committed writes.
+Routers call these right after db.commit(); the FTS5 table is kept in
+sync by SQLite triggers instead (see utils/fts.py).
+"""
+from typing import Iterable
+
+from sqlalchemy.orm import Session
+
+import models
+from utils.ngram_index import ngram_index
+from utils.search_cache import search_cache
+from utils.suggest_index import suggest_index
+from utils.trigram_index import trigram_index
+from utils.tree_cache import tree_cache
+
+def build_indexes(db: Session):
+    ngram_index.build(db)
+    trigram_index.build(db)
+    suggest_index.build(db)
+
+def document_saved(doc: models.Document):
+    ngram_index.add_document(doc)
+    trigram_index.add_document(doc)
+    suggest_index.add_document(doc)
+    search_cache.bump()
+    tree_cache.bump()
+
+def documents_saved(docs: Iterable):
+    """Batch form of document_saved; docs may be Document rows or column tuples with the same names."""
+    for doc in docs:
+        ngram_index.add_document(doc)
+        trigram_index.add_document(doc)
+        suggest_index.add_document(doc)
+    search_cache.bump()
+    tree_cache.bump()
+
+def documents_deleted(doc_ids: Iterable[int]):
+    doc_ids = list(doc_ids)
+    ngram_index.remove_documents(doc_ids)
+    trigram_index.remove_documents(doc_ids)
+    suggest_index.remove("doc", doc_ids)
+    search_cache.bump()
+    tree_cache.bump()
+
+def category_saved(category: models.Category):
+    suggest_index.add_category(category)
+    search_cache.bump() # Search results carry category names
+    tree_cache.bump()
+
+def subcategory_saved(subcategory: models.SubCategory):
+    suggest_index.add_subcategory(subcategory)
+    search_cache.bump()
+    tree_cache.bump()
+
+def structure_deleted(category_ids: Iterable[int], subcategory_ids: Iterable[int], doc_ids: Iterable[int]):
+    suggest_index.remove("category", category_ids)
+    suggest_index.remove("subcategory", subcategory_ids)
+    documents_deleted(doc_ids)
+
+def order_changed():
+    # Sort orders only affect the navigation tree
+    tree_cache.bump()
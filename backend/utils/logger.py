@@ -1,17 +1,39 @@
+from datetime import datetime
+
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.orm import Session
-from models import ActivityLog
+from models import ActivityDaily, ActivityLog
 
-def log_activity(db: Session, user_id: int, action: str, target_id: int, target_type: str, details: str = None):
+def log_activity(db: Session, user_id: int, action: str, target_id: int, target_type: str, details: str = None, commit: bool = True):
+    """
+    With commit=False the entry joins the caller's transaction instead of committing on its own.
+    The entry is written in a savepoint, so a failure to log only drops the entry and never
+    the caller's pending work; failures of the caller's own writes are raised, not swallowed.
+    """
+    if not commit:
+        db.flush()
     try:
-        activity = ActivityLog(
-            user_id=user_id,
-            action=action,
-            target_id=target_id,
-            target_type=target_type,
-            details=details
-        )
-        db.add(activity)
-        db.commit()
+        with db.begin_nested():
+            now = datetime.now()
+            db.add(ActivityLog(
+                user_id=user_id,
+                action=action,
+                target_id=target_id,
+                target_type=target_type,
+                details=details,
+                created_at=now
+            ))
+            # Heatmap rollup, in the same transaction as the log entry
+            rollup = insert(ActivityDaily).values(user_id=user_id, day=now.date(), count=1)
+            db.execute(rollup.on_conflict_do_update(
+                index_elements=[ActivityDaily.user_id, ActivityDaily.day],
+                set_={"count": ActivityDaily.count + 1},
+            ))
     except Exception as e:
         print(f"Failed to log activity: {e}")
-        db.rollback()
+    if commit:
+        try:
+            db.commit()
+        except Exception as e:
+            print(f"Failed to log activity: {e}")
+            db.rollback()
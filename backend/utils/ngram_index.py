@@ -0,0 +1,146 @@
+import re
+import threading
+from array import array
+from bisect import bisect_left, insort
+from typing import Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+
+# Han, kana and hangul: scripts without spaces between words
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+_token_pattern = re.compile(rf"([{_CJK}]+)|((?:(?![{_CJK}])\w)+)")
+
+_cjk_run_pattern = re.compile(rf"[{_CJK}]+")
+
+def cjk_runs(text: str) -> List[str]:
+    return _cjk_run_pattern.findall(text)
+
+def is_cjk(term: str) -> bool:
+    return bool(term) and _cjk_run_pattern.fullmatch(term) is not None
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into index tokens: every CJK character plus overlapping
+    CJK bigrams, and whole lowercase words for everything else.
+    """
+    tokens = []
+    if not text:
+        return tokens
+    for cjk, word in _token_pattern.findall(text.lower()):
+        if cjk:
+            tokens.extend(cjk)
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+def query_tokens(q: str) -> List[str]:
+    """Tokens a document must contain to match q: bigrams for CJK runs longer than one char."""
+    tokens = []
+    for cjk, word in _token_pattern.findall(q.lower()):
+        if len(cjk) == 1:
+            tokens.append(cjk)
+        elif cjk:
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        else:
+            tokens.append(word)
+    return list(dict.fromkeys(tokens))
+
+class NgramIndex:
+    """
+    In-process inverted index: token -> sorted array of document ids.
+    Kept current by the docs router on every write. Each worker process
+    holds its own copy, built from the database at startup.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {}
+        # doc id -> (title tokens, all tokens, is_public), needed to unindex a document
+        self._docs = {}
+        self.ready = False
+
+    def build(self, db: Session):
+        rows = db.query(
+            models.Document.id, models.Document.title, models.Document.plain_text, models.Document.is_public
+        ).yield_per(500)
+        with self._lock:
+            self._postings = {}
+            self._docs = {}
+            for row in rows:
+                self._add(row.id, row.title, row.plain_text, row.is_public)
+            self.ready = True
+        print(f"--- N-gram index built: {len(self._docs)} docs, {len(self._postings)} tokens ---")
+
+    def add_document(self, doc: models.Document):
+        with self._lock:
+            self._remove(doc.id)
+            self._add(doc.id, doc.title, doc.plain_text, doc.is_public)
+
+    def remove_documents(self, doc_ids: Iterable[int]):
+        with self._lock:
+            for doc_id in doc_ids:
+                self._remove(doc_id)
+
+    def search(self, q: str, public_only: bool = False, allowed: Optional[Set[int]] = None) -> Optional[List[Tuple[int, int]]]:
+        """
+        (score, doc id) pairs for documents containing every query token,
+        sorted with title matches (score 0) ahead of body-only matches (score 1).
+        allowed restricts the intersection to those doc ids (scope filters).
+        Returns None if the query has no indexable tokens.
+        """
+        tokens = query_tokens(q)
+        if not tokens:
+            return None
+        with self._lock:
+            lists = [self._postings.get(token) for token in tokens]
+            if not all(lists) or allowed is not None and not allowed:
+                return []
+            lists.sort(key=len)
+            # Drive the intersection from the smallest candidate set
+            if allowed is not None and len(allowed) < len(lists[0]):
+                candidates, rest = sorted(allowed), lists
+            else:
+                candidates, rest = lists[0], lists[1:]
+            hits = []
+            for doc_id in candidates:
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                if all(_contains(postings, doc_id) for postings in rest):
+                    title_tokens, _, is_public = self._docs[doc_id]
+                    if public_only and not is_public:
+                        continue
+                    hits.append((0 if all(t in title_tokens for t in tokens) else 1, doc_id))
+        hits.sort()
+        return hits
+
+    def _add(self, doc_id: int, title: str, plain_text: str, is_public: bool):
+        title_tokens = frozenset(tokenize(title))
+        tokens = tuple(title_tokens.union(tokenize(plain_text)))
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                self._postings[token] = array("I", [doc_id])
+            else:
+                insort(postings, doc_id)
+        self._docs[doc_id] = (title_tokens, tokens, bool(is_public))
+
+    def _remove(self, doc_id: int):
+        entry = self._docs.pop(doc_id, None)
+        if entry is None:
+            return
+        for token in entry[1]:
+            postings = self._postings[token]
+            i = bisect_left(postings, doc_id)
+            if i < len(postings) and postings[i] == doc_id:
+                del postings[i]
+            if not postings:
+                del self._postings[token]
+
+def _contains(postings: array, doc_id: int) -> bool:
+    i = bisect_left(postings, doc_id)
+    return i < len(postings) and postings[i] == doc_id
+
+ngram_index = NgramIndex()
@@ -0,0 +1,77 @@
+"""
+Sparse sort orders for drag-and-drop.
+
+Siblings are spaced SORT_GAP apart, so moving one item between two
+neighbours is a single-row UPDATE to the midpoint of their sort orders.
+When a gap runs out the sibling list is renumbered in one batched UPDATE.
+"""
+from typing import List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import case
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from utils import index_sync
+
+SORT_GAP = 1024
+# Renumber in the background once a midpoint leaves less room than this
+MIN_GAP = 4
+
+def assign_order(db: Session, model, ids: List[int]):
+    """Give ids consecutive gapped sort orders with one UPDATE ... CASE statement."""
+    if not ids:
+        return
+    db.query(model).filter(model.id.in_(ids)).update(
+        {model.sort_order: case({item_id: index * SORT_GAP for index, item_id in enumerate(ids)}, value=model.id)},
+        synchronize_session=False,
+    )
+
+def sibling_ids(db: Session, model, siblings) -> List[int]:
+    return [item_id for (item_id,) in db.query(model.id).filter(siblings).order_by(model.sort_order, model.id)]
+
+def rebalance(model, siblings):
+    """Renumber a sibling list; runs as a background task with its own session."""
+    db = SessionLocal()
+    try:
+        assign_order(db, model, sibling_ids(db, model, siblings))
+        db.commit()
+        index_sync.order_changed()
+    finally:
+        db.close()
+
+def place_between(db: Session, model, item, siblings, after_id: Optional[int], before_id: Optional[int]) -> bool:
+    """
+    Move item so it sorts after after_id and before before_id (either may be None
+    for the ends of the list). Returns True if the list should be rebalanced soon.
+    Does not commit.
+    """
+    def neighbour_order(neighbour_id: Optional[int]):
+        if neighbour_id is None:
+            return None
+        row = db.query(model.id, model.sort_order).filter(model.id == neighbour_id, siblings).first()
+        if row is None or neighbour_id == item.id:
+            raise HTTPException(status_code=400, detail=f"Item {neighbour_id} is not a sibling")
+        return row.sort_order or 0
+
+    lo = neighbour_order(after_id)
+    hi = neighbour_order(before_id)
+
+    if lo is None and hi is None:
+        new_order = 0
+    elif lo is None:
+        new_order = hi - SORT_GAP
+    elif hi is None:
+        new_order = lo + SORT_GAP
+    elif hi - lo >= 2:
+        new_order = (lo + hi) // 2
+    else:
+        # Neighbours share a sort order (or are out of order): renumber the list now
+        ids = [item_id for item_id in sibling_ids(db, model, siblings) if item_id != item.id]
+        position = ids.index(before_id) if before_id is not None else len(ids)
+        ids.insert(position, item.id)
+        assign_order(db, model, ids)
+        return False
+
+    db.query(model).filter(model.id == item.id).update({model.sort_order: new_order}, synchronize_session=False)
+    return lo is not None and hi is not None and hi - lo < MIN_GAP * 2
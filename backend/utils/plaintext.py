@@ -0,0 +1,36 @@
+import re
+
+# Order matters: images before links, fences before inline code
+_fence_pattern = re.compile(r"^\s*(```|~~~).*$", re.MULTILINE)
+_image_pattern = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_link_pattern = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_html_tag_pattern = re.compile(r"<[^>]+>")
+_heading_pattern = re.compile(r"^\s{0,3}#{1,6}\s*", re.MULTILINE)
+_quote_pattern = re.compile(r"^\s*>+\s?", re.MULTILINE)
+_list_pattern = re.compile(r"^\s*(?:[-*+]|\d+\.)\s+(?:\[[ xX]\]\s*)?", re.MULTILINE)
+_table_rule_pattern = re.compile(r"^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$", re.MULTILINE)
+_hr_pattern = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$", re.MULTILINE)
+# Underscores are left alone: they are far more common in identifiers than as emphasis
+_emphasis_pattern = re.compile(r"\*\*|\*|~~|`")
+_space_pattern = re.compile(r"\s+")
+
+def markdown_to_plaintext(content: str) -> str:
+    """
+    Text a reader actually sees in a Markdown document: no syntax, no fence
+    markers, no image/link URLs (alt and link text are kept). Code inside
+    fences is kept since people search for it.
+    """
+    if not content:
+        return ""
+    text = _fence_pattern.sub(" ", content)
+    text = _image_pattern.sub(r"\1", text)
+    text = _link_pattern.sub(r"\1", text)
+    text = _html_tag_pattern.sub(" ", text)
+    text = _table_rule_pattern.sub(" ", text)
+    text = _hr_pattern.sub(" ", text)
+    text = _heading_pattern.sub("", text)
+    text = _quote_pattern.sub("", text)
+    text = _list_pattern.sub("", text)
+    text = _emphasis_pattern.sub("", text)
+    text = text.replace("|", " ")
+    return _space_pattern.sub(" ", text).strip()
@@ -0,0 +1,152 @@
+"""
+Server-side Markdown rendering, done once when a document is written.
+
+Mirrors the DocView.vue markdown-it setup (html, linkify, breaks,
+typographer, mark/sub/sup/task lists) so pre-rendered pages look the same
+as client-rendered ones. Code blocks are highlighted with Pygments but emit
+highlight.js class names, so the existing github-dark stylesheet applies.
+The output is sanitized, since raw HTML in documents is allowed.
+"""
+import html
+from typing import List, Tuple
+
+import nh3
+from markdown_it import MarkdownIt
+from markdown_it.rules_inline import StateInline
+from mdit_py_plugins.subscript import sub_plugin
+from mdit_py_plugins.superscript import superscript_plugin
+from mdit_py_plugins.tasklists import tasklists_plugin
+from pygments.lexers import get_lexer_by_name
+from pygments.token import Token
+from pygments.util import ClassNotFound
+
+# Bump when the rendering changes; the backfill re-renders older rows
+RENDER_VERSION = 1
+
+# Headings that get an anchor and a TOC entry (same as DocView.vue)
+TOC_LEVELS = ("h1", "h2", "h3", "h4")
+
+# Pygments token type -> highlight.js class, most specific first
+HLJS_CLASSES = [
+    (Token.Comment.Preproc, "hljs-meta"),
+    (Token.Comment, "hljs-comment"),
+    (Token.Keyword.Constant, "hljs-literal"),
+    (Token.Keyword.Type, "hljs-type"),
+    (Token.Keyword, "hljs-keyword"),
+    (Token.Name.Builtin, "hljs-built_in"),
+    (Token.Name.Class, "hljs-title class_"),
+    (Token.Name.Function, "hljs-title function_"),
+    (Token.Name.Decorator, "hljs-meta"),
+    (Token.Name.Tag, "hljs-name"),
+    (Token.Name.Attribute, "hljs-attr"),
+    (Token.Name.Variable, "hljs-variable"),
+    (Token.Name.Constant, "hljs-variable constant_"),
+    (Token.Name.Exception, "hljs-title class_"),
+    (Token.Literal.String.Regex, "hljs-regexp"),
+    (Token.Literal.String.Escape, "hljs-char escape_"),
+    (Token.Literal.String, "hljs-string"),
+    (Token.Literal.Number, "hljs-number"),
+    (Token.Operator.Word, "hljs-keyword"),
+    (Token.Generic.Heading, "hljs-section"),
+    (Token.Generic.Subheading, "hljs-section"),
+    (Token.Generic.Deleted, "hljs-deletion"),
+    (Token.Generic.Inserted, "hljs-addition"),
+    (Token.Generic.Emph, "hljs-emphasis"),
+    (Token.Generic.Strong, "hljs-strong"),
+]
+
+ALLOWED_TAGS = nh3.ALLOWED_TAGS | {"input", "mark", "span", "sub", "sup", "del", "s", "details", "summary"}
+ALLOWED_ATTRIBUTES = {
+    **nh3.ALLOWED_ATTRIBUTES,
+    **{tag: {"id"} for tag in ("h1", "h2", "h3", "h4", "h5", "h6")},
+    "a": {"href", "title"},
+    "img": {"src", "alt", "title", "width", "height"},
+    "input": {"class", "type", "checked", "disabled"},
+    "pre": {"class"},
+    "code": {"class"},
+    "span": {"class"},
+    "ul": {"class"},
+    "ol": {"class", "start"},
+    "li": {"class"},
+    "th": {"align", "style"},
+    "td": {"align", "style"},
+}
+
+def token_class(ttype) -> str:
+    for parent, css_class in HLJS_CLASSES:
+        if ttype in parent:
+            return css_class
+    return ""
+
+def highlight_code(code: str, lang: str, attrs) -> str:
+    lang = lang.split()[0] if lang and lang.split() else ""
+    try:
+        lexer = get_lexer_by_name(lang) if lang else None
+    except ClassNotFound:
+        lexer = None
+    if lexer is None:
+        return f'<pre class="hljs"><code>{html.escape(code, quote=False)}</code></pre>'
+
+    # Merge runs of the same class (Pygments splits e.g. strings into quote/body/quote)
+    runs = []
+    for ttype, value in lexer.get_tokens(code):
+        css_class = token_class(ttype) if value.strip() else ""
+        if runs and runs[-1][0] == css_class:
+            runs[-1][1] += value
+        else:
+            runs.append([css_class, value])
+    body = "".join(
+        f'<span class="{css_class}">{html.escape(value, quote=False)}</span>' if css_class else html.escape(value, quote=False)
+        for css_class, value in runs
+    )
+    return f'<pre class="hljs"><code class="language-{html.escape(lang)}">{body}</code></pre>'
+
+def mark_rule(state: StateInline, silent: bool) -> bool:
+    """==marked text== -> <mark>, like markdown-it-mark."""
+    start = state.pos
+    if silent or not state.src.startswith("==", start):
+        return False
+    end = state.src.find("==", start + 2, state.posMax)
+    content = state.src[start + 2:end] if end != -1 else ""
+    if not content or content != content.strip():
+        return False
+
+    maximum = state.posMax
+    state.push("mark_open", "mark", 1).markup = "=="
+    state.pos, state.posMax = start + 2, end
+    state.md.inline.tokenize(state)
+    state.push("mark_close", "mark", -1).markup = "=="
+    state.pos, state.posMax = end + 2, maximum
+    return True
+
+def build_renderer() -> MarkdownIt:
+    md = MarkdownIt(
+        "js-default",
+        {"html": True, "linkify": True, "breaks": True, "typographer": True, "highlight": highlight_code},
+    )
+    md.use(sub_plugin).use(superscript_plugin).use(tasklists_plugin)
+    md.inline.ruler.before("emphasis", "mark", mark_rule)
+    return md
+
+md = build_renderer()
+
+def render_markdown(content: str) -> Tuple[str, List[dict]]:
+    """
+    Sanitized HTML for content plus its table of contents,
+    [{"id": "heading-0", "text": ..., "level": 1}, ...].
+    Heading ids follow the heading-<n> scheme DocView.vue used.
+    """
+    if not content:
+        return "", []
+    env = {}
+    tokens = md.parse(content, env)
+    toc = []
+    for i, token in enumerate(tokens):
+        if token.type == "heading_open" and token.tag in TOC_LEVELS:
+            anchor = f"heading-{len(toc)}"
+            token.attrSet("id", anchor)
+            inline = tokens[i + 1]
+            text = "".join(child.content for child in inline.children or [] if child.type in ("text", "code_inline"))
+            toc.append({"id": anchor, "text": text, "level": int(token.tag[1])})
+    rendered = md.renderer.render(tokens, md.options, env)
+    return nh3.clean(rendered, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES, link_rel="noopener noreferrer"), toc
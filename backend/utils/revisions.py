@@ -0,0 +1,141 @@
+"""
+Document revision history stored as compressed line deltas.
+
+Revision n stores only the line ranges that changed since revision n-1
+(zlib-compressed JSON), so an edit costs storage proportional to the edit.
+Every SNAPSHOT_EVERY revisions, or when a delta would not be smaller than
+the full text, a compressed snapshot is stored instead, which bounds how
+many deltas have to be replayed to rebuild any revision.
+"""
+import difflib
+import json
+import re
+import zlib
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+import models
+
+SNAPSHOT_EVERY = 20
+
+def pack(value) -> bytes:
+    return zlib.compress(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+def unpack(data: bytes):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+def make_delta(old: str, new: str) -> List[list]:
+    """[[start, end, replacement], ...] over old's lines, in order."""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    return [
+        [i1, i2, "".join(new_lines[j1:j2])]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != "equal"
+    ]
+
+def apply_delta(old: str, delta: List[list]) -> str:
+    old_lines = old.splitlines(keepends=True)
+    parts = []
+    position = 0
+    for start, end, replacement in delta:
+        parts.extend(old_lines[position:start])
+        parts.append(replacement)
+        position = end
+    parts.extend(old_lines[position:])
+    return "".join(parts)
+
+# UTF-16 surrogate halves; never valid on their own in stored text
+_lone_surrogate = re.compile("[\ud800-\udfff]")
+
+def apply_edits(content: str, edits) -> str:
+    """
+    Apply non-overlapping [start, end) splices (schemas.TextEdit), given in order, to content.
+    Offsets count code points (Python str indices), not UTF-16 units.
+    """
+    parts = []
+    position = 0
+    for edit in edits:
+        if edit.start < position or edit.end < edit.start or edit.end > len(content):
+            raise HTTPException(status_code=400, detail="Edits must be in order, non-overlapping and within the base content")
+        parts.append(content[position:edit.start])
+        parts.append(edit.text)
+        position = edit.end
+    parts.append(content[position:])
+    result = "".join(parts)
+    if _lone_surrogate.search(result):
+        raise HTTPException(status_code=400, detail="Edits must not split surrogate pairs; send code point offsets")
+    return result
+
+def record_revision(db: Session, document: models.Document, author_id: int,
+                    previous: Optional[str] = None, previous_title: Optional[str] = None):
+    """
+    Add a revision for document's current title/content (not committed).
+    previous/previous_title are the values before this edit; None for a new document.
+    Documents that predate revision tracking get their previous content
+    recorded as a baseline snapshot first. Bumps document.version.
+    """
+    number = document.version or 0
+    if number == 0 and previous is not None:
+        db.add(models.DocumentRevision(
+            document_id=document.id, number=1, kind="snapshot",
+            title=previous_title or document.title, author_id=document.author_id,
+            size=len(previous), data=pack(previous),
+        ))
+        number = 1
+
+    content = document.content or ""
+    snapshot = pack(content)
+    kind, data = "snapshot", snapshot
+    if number and previous is not None and (number + 1) % SNAPSHOT_EVERY != 1:
+        delta = pack(make_delta(previous, content))
+        if len(delta) < len(snapshot):
+            kind, data = "delta", delta
+
+    db.add(models.DocumentRevision(
+        document_id=document.id, number=number + 1, kind=kind,
+        title=document.title, author_id=author_id,
+        size=len(content), data=data,
+    ))
+    document.version = number + 1
+
+def delete_revisions(db: Session, doc_ids: List[int]):
+    """Remove the history of doc_ids in one statement, without loading any revision data."""
+    if doc_ids:
+        db.query(models.DocumentRevision).filter(models.DocumentRevision.document_id.in_(doc_ids)).delete(synchronize_session=False)
+
+def reconstruct(db: Session, doc_id: int, number: int) -> Optional[Tuple[models.DocumentRevision, str]]:
+    """Revision row and its full content: the nearest snapshot plus the deltas after it."""
+    base = (
+        db.query(models.DocumentRevision.number)
+        .filter(
+            models.DocumentRevision.document_id == doc_id,
+            models.DocumentRevision.number <= number,
+            models.DocumentRevision.kind == "snapshot",
+        )
+        .order_by(models.DocumentRevision.number.desc())
+        .limit(1)
+        .scalar()
+    )
+    if base is None:
+        return None
+    chain = (
+        db.query(models.DocumentRevision)
+        .filter(
+            models.DocumentRevision.document_id == doc_id,
+            models.DocumentRevision.number >= base,
+            models.DocumentRevision.number <= number,
+        )
+        .order_by(models.DocumentRevision.number)
+        .all()
+    )
+    if not chain or chain[-1].number != number:
+        return None
+
+    content = unpack(chain[0].data)
+    for revision in chain[1:]:
+        content = apply_delta(content, unpack(revision.data))
+    return chain[-1], content
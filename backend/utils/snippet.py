@@ -0,0 +1,66 @@
+import re
+from typing import List, Tuple
+
+# Context kept around each hit, mirroring what SearchView.vue used to show
+CONTEXT_BEFORE = 30
+CONTEXT_AFTER = 60
+MAX_WINDOWS = 3
+# Hit-dense text would otherwise merge into one window spanning the document
+MAX_WINDOW_LENGTH = 240
+MAX_HIGHLIGHTS = 10
+# Shown when the hit is only in the title
+LEAD_LENGTH = 120
+ELLIPSIS = "..."
+
+def find_hits(text: str, terms: List[str]) -> List[Tuple[int, int]]:
+    """Case-insensitive [start, end) spans of every term in text, merged and sorted."""
+    if not text or not terms:
+        return []
+    pattern = re.compile("|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    spans = []
+    for m in pattern.finditer(text):
+        if spans and m.start() <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], max(spans[-1][1], m.end()))
+        else:
+            spans.append((m.start(), m.end()))
+    return spans
+
+def build_snippets(text: str, terms: List[str], max_windows: int = MAX_WINDOWS) -> List[dict]:
+    """
+    Keyword-in-context windows around the hits in text.
+    Each window is {"text": ..., "highlights": [[start, end], ...]} with
+    highlight offsets relative to the window text (ellipses included).
+    """
+    hits = find_hits(text, terms)
+    if not hits:
+        lead = text[:LEAD_LENGTH]
+        return [{"text": lead + (ELLIPSIS if len(text) > LEAD_LENGTH else ""), "highlights": []}] if lead else []
+
+    # Group hits whose context windows overlap, up to MAX_WINDOW_LENGTH / MAX_HIGHLIGHTS per window
+    windows = []
+    for start, end in hits:
+        w_start = max(0, start - CONTEXT_BEFORE)
+        w_end = min(len(text), end + CONTEXT_AFTER)
+        if windows and w_start <= windows[-1][1]:
+            last = windows[-1]
+            if w_end - last[0] <= MAX_WINDOW_LENGTH and len(last[2]) < MAX_HIGHLIGHTS:
+                last[1] = max(last[1], w_end)
+                last[2].append((start, end))
+                continue
+            # Full: split the overlap between the two windows
+            w_start = max(w_start, last[2][-1][1])
+            last[1] = w_start
+        if len(windows) == max_windows:
+            break
+        windows.append([w_start, w_end, [(start, end)]])
+
+    snippets = []
+    for w_start, w_end, spans in windows:
+        prefix = ELLIPSIS if w_start > 0 else ""
+        suffix = ELLIPSIS if w_end < len(text) else ""
+        shift = len(prefix) - w_start
+        snippets.append({
+            "text": prefix + text[w_start:w_end] + suffix,
+            "highlights": [[s + shift, min(e, w_end) + shift] for s, e in spans],
+        })
+    return snippets
@@ -0,0 +1,125 @@
+"""
+Materialized counters behind /api/stats.
+
+stats_counters holds one row per scope: ('site', 0) for the totals,
+('category', id) and ('author', id) for the breakdowns. SQLite triggers
+on documents, users and sub_categories adjust the rows inside the same
+transaction as the write, so every path (ORM, bulk Core statements,
+cascading deletes) stays counted without the routers doing anything,
+the same way the FTS table is kept in sync (utils/fts.py).
+
+reconcile() recounts everything from scratch:
+
+    python -m utils.stats_counters
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+def _bump(scope: str, scope_id: str, docs: str, public: str, users: str = "0", guard: str = "") -> str:
+    """Upsert adding the given deltas to one counter row (SQL fragments)."""
+    where = f"WHERE {guard}" if guard else "WHERE 1"
+    return f"""
+            INSERT INTO stats_counters(scope, scope_id, docs, public_docs, users)
+            SELECT {scope}, {scope_id}, {docs}, {public}, {users} {where}
+            ON CONFLICT(scope, scope_id) DO UPDATE SET
+                docs = docs + excluded.docs,
+                public_docs = public_docs + excluded.public_docs,
+                users = users + excluded.users;"""
+
+def _category_of(sub_category_id: str) -> str:
+    return f"(SELECT category_id FROM sub_categories WHERE id = {sub_category_id})"
+
+def _document_delta(row: str, sign: str) -> str:
+    """Count (sign=+1) or uncount (sign=-1) the document in new/old at every scope."""
+    public = f"{sign} * COALESCE({row}.is_public, 0)"
+    return "".join([
+        _bump("'site'", "0", sign, public),
+        _bump("'category'", _category_of(f"{row}.sub_category_id"), sign, public,
+              guard=f"{_category_of(f'{row}.sub_category_id')} IS NOT NULL"),
+        _bump("'author'", f"{row}.author_id", sign, public, guard=f"{row}.author_id IS NOT NULL"),
+    ])
+
+STATS_TRIGGERS = {
+    "stats_documents_ai": f"""
+        CREATE TRIGGER stats_documents_ai AFTER INSERT ON documents BEGIN{_document_delta("new", "1")}
+        END""",
+    "stats_documents_ad": f"""
+        CREATE TRIGGER stats_documents_ad AFTER DELETE ON documents BEGIN{_document_delta("old", "-1")}
+        END""",
+    "stats_documents_au": f"""
+        CREATE TRIGGER stats_documents_au AFTER UPDATE OF is_public, sub_category_id, author_id ON documents BEGIN{_document_delta("old", "-1")}{_document_delta("new", "1")}
+        END""",
+    "stats_users_ai": f"""
+        CREATE TRIGGER stats_users_ai AFTER INSERT ON users BEGIN{_bump("'site'", "0", "0", "0", users="1")}
+        END""",
+    "stats_users_ad": f"""
+        CREATE TRIGGER stats_users_ad AFTER DELETE ON users BEGIN{_bump("'site'", "0", "0", "0", users="-1")}
+        END""",
+    # A sub-category moving to another category takes its documents' counts along
+    "stats_sub_categories_au": f"""
+        CREATE TRIGGER stats_sub_categories_au AFTER UPDATE OF category_id ON sub_categories
+        WHEN old.category_id IS NOT new.category_id BEGIN
+            UPDATE stats_counters SET
+                docs = docs - (SELECT COUNT(*) FROM documents WHERE sub_category_id = old.id),
+                public_docs = public_docs - (SELECT COUNT(*) FROM documents WHERE sub_category_id = old.id AND is_public)
+            WHERE scope = 'category' AND scope_id = old.category_id;
+            {_bump("'category'", "new.category_id",
+                   "(SELECT COUNT(*) FROM documents WHERE sub_category_id = new.id)",
+                   "(SELECT COUNT(*) FROM documents WHERE sub_category_id = new.id AND is_public)",
+                   guard="new.category_id IS NOT NULL").strip()}
+        END""",
+    "stats_categories_ad": """
+        CREATE TRIGGER stats_categories_ad AFTER DELETE ON categories BEGIN
+            DELETE FROM stats_counters WHERE scope = 'category' AND scope_id = old.id;
+        END""",
+}
+
+RECONCILE_SQL = [
+    "DELETE FROM stats_counters",
+    """INSERT INTO stats_counters(scope, scope_id, docs, public_docs, users)
+        SELECT 'site', 0,
+            (SELECT COUNT(*) FROM documents),
+            (SELECT COUNT(*) FROM documents WHERE is_public),
+            (SELECT COUNT(*) FROM users)""",
+    """INSERT INTO stats_counters(scope, scope_id, docs, public_docs, users)
+        SELECT 'category', s.category_id, COUNT(*), COALESCE(SUM(d.is_public), 0), 0
+        FROM documents d JOIN sub_categories s ON s.id = d.sub_category_id
+        WHERE s.category_id IS NOT NULL
+        GROUP BY s.category_id""",
+    """INSERT INTO stats_counters(scope, scope_id, docs, public_docs, users)
+        SELECT 'author', author_id, COUNT(*), COALESCE(SUM(is_public), 0), 0
+        FROM documents WHERE author_id IS NOT NULL
+        GROUP BY author_id""",
+]
+
+def _reconcile(conn):
+    for statement in RECONCILE_SQL:
+        conn.execute(text(statement))
+
+def reconcile(engine: Engine):
+    """Recount every counter from the base tables (one transaction)."""
+    with engine.begin() as conn:
+        _reconcile(conn)
+
+def init_stats(engine: Engine):
+    """
+    Create the counter triggers if missing or outdated; when that happens
+    the counters can't be trusted, so they are reconciled in the same transaction.
+    """
+    with engine.begin() as conn:
+        existing = dict(conn.execute(text(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'stats_%'"
+        )).all())
+        if existing == {name: ddl.strip() for name, ddl in STATS_TRIGGERS.items()}:
+            return
+        for name in existing:
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+        for ddl in STATS_TRIGGERS.values():
+            conn.execute(text(ddl.strip()))
+        _reconcile(conn)
+    print("--- Stats counters rebuilt ---")
+
+if __name__ == "__main__":
+    from database import engine
+    reconcile(engine)
+    print("Stats counters reconciled")
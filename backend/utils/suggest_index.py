@@ -0,0 +1,104 @@
+import threading
+from bisect import bisect_left, insort
+from typing import List
+
+from sqlalchemy.orm import Session
+
+import models
+
+def _prefix_keys(name: str) -> List[str]:
+    """The whole lowercase name plus its tail from each later word, so "FastAPI 入门" is found by "入"."""
+    name = (name or "").strip().lower()
+    if not name:
+        return []
+    keys = [name]
+    words = name.split()
+    for i in range(1, len(words)):
+        keys.append(" ".join(words[i:]))
+    return keys
+
+class SuggestIndex:
+    """
+    Sorted prefix index over document titles and category/subcategory names
+    for typeahead. Lookups are a bisect plus a short forward scan.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Sorted (key, kind, id) tuples
+        self._keys = []
+        # (kind, id) -> (keys, entry dict)
+        self._entries = {}
+        self.ready = False
+
+    def build(self, db: Session):
+        with self._lock:
+            self._keys = []
+            self._entries = {}
+            for cat in db.query(models.Category.id, models.Category.name):
+                self._put("category", cat.id, cat.name, {})
+            for sub in db.query(models.SubCategory.id, models.SubCategory.name, models.SubCategory.category_id):
+                self._put("subcategory", sub.id, sub.name, {"category_id": sub.category_id})
+            for doc in db.query(models.Document.id, models.Document.title, models.Document.sub_category_id, models.Document.is_public):
+                self._put("doc", doc.id, doc.title, {"sub_category_id": doc.sub_category_id, "is_public": bool(doc.is_public)})
+            self._keys.sort()
+            self.ready = True
+
+    def add_document(self, doc: models.Document):
+        with self._lock:
+            self._put("doc", doc.id, doc.title, {"sub_category_id": doc.sub_category_id, "is_public": bool(doc.is_public)}, keep_sorted=True)
+
+    def add_category(self, category: models.Category):
+        with self._lock:
+            self._put("category", category.id, category.name, {}, keep_sorted=True)
+
+    def add_subcategory(self, subcategory: models.SubCategory):
+        with self._lock:
+            self._put("subcategory", subcategory.id, subcategory.name, {"category_id": subcategory.category_id}, keep_sorted=True)
+
+    def remove(self, kind: str, ids):
+        with self._lock:
+            for item_id in ids:
+                self._drop(kind, item_id)
+
+    def suggest(self, prefix: str, limit: int = 10, public_only: bool = False) -> List[dict]:
+        prefix = prefix.strip().lower()
+        results = []
+        seen = set()
+        with self._lock:
+            i = bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and len(results) < limit:
+                key, kind, item_id = self._keys[i]
+                i += 1
+                if not key.startswith(prefix):
+                    break
+                if (kind, item_id) in seen:
+                    continue
+                entry = self._entries[(kind, item_id)][1]
+                if public_only and not entry.get("is_public", True):
+                    continue
+                seen.add((kind, item_id))
+                results.append(entry)
+        return results
+
+    def _put(self, kind: str, item_id: int, name: str, extra: dict, keep_sorted: bool = False):
+        self._drop(kind, item_id)
+        keys = _prefix_keys(name)
+        entry = {"type": kind, "id": item_id, "name": name or "", **extra}
+        self._entries[(kind, item_id)] = (keys, entry)
+        for key in keys:
+            if keep_sorted:
+                insort(self._keys, (key, kind, item_id))
+            else:
+                self._keys.append((key, kind, item_id))
+
+    def _drop(self, kind: str, item_id: int):
+        existing = self._entries.pop((kind, item_id), None)
+        if existing is None:
+            return
+        for key in existing[0]:
+            i = bisect_left(self._keys, (key, kind, item_id))
+            if i < len(self._keys) and self._keys[i] == (key, kind, item_id):
+                del self._keys[i]
+
+suggest_index = SuggestIndex()
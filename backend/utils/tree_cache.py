@@ -0,0 +1,38 @@
+import hashlib
+import threading
+from typing import Callable, Tuple
+
+class TreeCache:
+    """
+    Pre-serialized navigation tree per audience ("public" / "member"),
+    stored as the JSON bytes sent on the wire plus a strong ETag.
+    Structure and document writes bump the generation, which invalidates
+    every audience at once.
+    """
+
+    def __init__(self):
+        self.generation = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, audience: str, build: Callable[[], bytes]) -> Tuple[str, bytes]:
+        with self._lock:
+            generation = self.generation
+            entry = self._entries.get(audience)
+            if entry is not None and entry[0] == generation:
+                return entry[1], entry[2]
+
+        body = build()
+        etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        with self._lock:
+            # A write that landed while building makes this tree stale; serve it once but don't keep it
+            if generation == self.generation:
+                self._entries[audience] = (generation, etag, body)
+        return etag, body
+
+    def bump(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+tree_cache = TreeCache()
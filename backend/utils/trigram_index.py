@@ -0,0 +1,151 @@
+import re
+import threading
+from array import array
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+
+DEFAULT_THRESHOLD = 0.3
+
+# Latin identifiers and words; CJK text is served by the n-gram index instead
+_word_pattern = re.compile(r"[0-9a-z_\u00c0-\u024f]{2,}")
+
+def words(text: str) -> List[str]:
+    return _word_pattern.findall(text.lower()) if text else []
+
+def trigrams(word: str) -> frozenset:
+    """pg_trgm-style trigrams: the word padded with two leading blanks and one trailing."""
+    padded = f"  {word} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+class TrigramIndex:
+    """
+    Typo-tolerant lookup over the vocabulary of all documents.
+    Query words are matched to indexed words by trigram similarity, then
+    to documents through per-word postings. Indexing the vocabulary
+    rather than every document's trigrams keeps memory proportional to
+    the number of distinct words.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # word -> sorted array of doc ids
+        self._word_docs = {}
+        # trigram -> set of words containing it
+        self._trigram_words = {}
+        # doc id -> (distinct words, is_public)
+        self._docs = {}
+        self.ready = False
+
+    def build(self, db: Session):
+        rows = db.query(
+            models.Document.id, models.Document.title, models.Document.plain_text, models.Document.is_public
+        ).yield_per(500)
+        with self._lock:
+            self._word_docs = {}
+            self._trigram_words = {}
+            self._docs = {}
+            for row in rows:
+                self._add(row.id, row.title, row.plain_text, row.is_public)
+            self.ready = True
+
+    def add_document(self, doc: models.Document):
+        with self._lock:
+            self._remove(doc.id)
+            self._add(doc.id, doc.title, doc.plain_text, doc.is_public)
+
+    def remove_documents(self, doc_ids: Iterable[int]):
+        with self._lock:
+            for doc_id in doc_ids:
+                self._remove(doc_id)
+
+    def search(self, q: str, threshold: float = DEFAULT_THRESHOLD, public_only: bool = False, allowed: Optional[Set[int]] = None) -> Optional[Tuple[List[Tuple[float, int]], Dict[int, List[str]]]]:
+        """
+        Documents where every query word has a similar-enough indexed word,
+        optionally restricted to the allowed doc ids (scope filters).
+        Returns ((score, doc id) pairs sorted best-first, where score is the
+        negated mean similarity, and doc id -> matched words for highlighting),
+        or None if q has no indexable words.
+        """
+        query_words = list(dict.fromkeys(words(q)))
+        if not query_words:
+            return None
+        with self._lock:
+            per_word = [self._similar_words(word, threshold) for word in query_words]
+            if not all(per_word):
+                return [], {}
+
+            # doc id -> sum over query words of the best similarity in that doc;
+            # narrowed on every round so only docs matching all words survive
+            best = None
+            matched = {}
+            for candidates in per_word:
+                scores = {}
+                for word, sim in candidates.items():
+                    for doc_id in self._word_docs[word]:
+                        if best is not None and doc_id not in best:
+                            continue
+                        if allowed is not None and doc_id not in allowed:
+                            continue
+                        if sim > scores.get(doc_id, 0.0):
+                            scores[doc_id] = sim
+                        matched.setdefault(doc_id, set()).add(word)
+                best = scores if best is None else {d: best[d] + s for d, s in scores.items()}
+
+            hits = []
+            for doc_id, total in best.items():
+                if public_only and not self._docs[doc_id][1]:
+                    continue
+                hits.append((-round(total / len(query_words), 6), doc_id))
+        hits.sort()
+        return hits, {doc_id: sorted(matched[doc_id]) for _, doc_id in hits}
+
+    def _similar_words(self, word: str, threshold: float) -> Dict[str, float]:
+        # Jaccard similarity of trigram sets, counting shared trigrams via the inverted map
+        query_trigrams = trigrams(word)
+        shared = {}
+        for trigram in query_trigrams:
+            for candidate in self._trigram_words.get(trigram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        result = {}
+        for candidate, count in shared.items():
+            sim = count / (len(query_trigrams) + len(trigrams(candidate)) - count)
+            if sim >= threshold:
+                result[candidate] = sim
+        return result
+
+    def _add(self, doc_id: int, title: str, plain_text: str, is_public: bool):
+        doc_words = tuple(set(words(title)).union(words(plain_text)))
+        for word in doc_words:
+            postings = self._word_docs.get(word)
+            if postings is None:
+                self._word_docs[word] = array("I", [doc_id])
+                for trigram in trigrams(word):
+                    self._trigram_words.setdefault(trigram, set()).add(word)
+            else:
+                insort(postings, doc_id)
+        self._docs[doc_id] = (doc_words, bool(is_public))
+
+    def _remove(self, doc_id: int):
+        entry = self._docs.pop(doc_id, None)
+        if entry is None:
+            return
+        for word in entry[0]:
+            postings = self._word_docs[word]
+            i = bisect_left(postings, doc_id)
+            if i < len(postings) and postings[i] == doc_id:
+                del postings[i]
+            if not postings:
+                # Last document using this word: drop it from the vocabulary
+                del self._word_docs[word]
+                for trigram in trigrams(word):
+                    bucket = self._trigram_words.get(trigram)
+                    if bucket is not None:
+                        bucket.discard(word)
+                        if not bucket:
+                            del self._trigram_words[trigram]
+
+trigram_index = TrigramIndex()
@@ -1,11 +1,25 @@
 import request from './request'
 
-export const getRecentActivities = (limit = 10) => {
+export interface ActivityFilter {
+  before?: string
+  before_id?: number
+  action?: string
+  target_type?: string
+}
+
+// Next page: pass the last item's time and id as before / before_id
+export const getRecentActivities = (limit = 10, filter: ActivityFilter = {}) => {
   return request.get('/api/activity/latest', {
-    params: { limit }
+    params: { limit, ...filter }
   })
 }
 
 export const getContributionData = () => {
   return request.get('/api/activity/heatmap')
 }
+
+export const getSiteContributionData = (from?: string, to?: string) => {
+  return request.get('/api/activity/heatmap/site', {
+    params: { from, to }
+  })
+}
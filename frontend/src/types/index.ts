@@ -28,12 +28,20 @@ export interface Document {
     sub_category_name?: string
 }
 
+// Document entry in /api/structure/tree (no content)
+export interface TreeDocument {
+    id: number
+    title: string
+    sort_order: number
+    is_public: boolean
+}
+
 export interface SubCategory {
     id: number
     category_id: number
     name: string
     sort_order: number
-    documents: Document[]
+    documents: TreeDocument[]
 }
 
 export interface Category {